@@ -1,141 +1,525 @@
 import statistics
-from collections import defaultdict, Counter
-import datetime
+from collections import Counter
 import local as lcl
+from data import Transaction, date_fields, select_range
+from money import divide_kopecks, to_rubles
+from sketches import QuantileSketch, RunningStats, SpaceSaving
 
 
-def calculate_basic_stats(transactions: list) -> dict:
+class Aggregator:
+    """
+    Accumulates every statistic the reports need in a single pass over transactions.
+
+    The aggregator keeps plain dictionaries only, so it can be pickled, merged and
+    updated chunk by chunk. The public analytics functions derive their results
+    from an aggregator instead of re-scanning the transaction list each time.
+    Monthly and quarterly buckets count expenses per category incrementally, so
+    their size depends on the number of categories, not of transactions.
+
+    In sketch mode the per-bucket category counts are bounded space-saving
+    summaries of `top_k` entries, and the expense amounts of every category feed a
+    running mean/variance and a quantile sketch, which give per-category medians and
+    percentiles over unbounded histories in bounded memory.
+
+    Amounts are summed in the type they come in. The unit is given explicitly:
+    transactions read with `kopecks=True` carry integer kopecks and need an
+    aggregator created with `kopecks=True`, so every total is exact and the analytics
+    functions convert them to rubles only when building their results. Otherwise
+    amounts are rubles, whether they are floats or integers.
+
+    Args:
+        sketch (bool): Keep approximate, bounded-memory summaries. Defaults to False.
+        top_k (int): Capacity of the per-bucket category summaries in sketch mode.
+        kopecks (bool): Amounts are integer kopecks. Defaults to False (rubles).
+    """
+
+    def __init__(self, sketch: bool = False, top_k: int = 64, kopecks: bool = False):
+        self.total_income = 0
+        self.total_expense = 0
+        self.transaction_count = 0
+        self.income_transactions = 0
+        self.expense_transactions = 0
+        self.categories = {}
+        self.category_expenses = {}
+        self.months = {}
+        self.quarters = {}
+        self.category_months = {}
+        self.invalid_dates = 0
+        self.sketch = sketch
+        self.top_k = top_k
+        self.kopecks = kopecks
+        self.category_stats = {}
+        self.category_quantiles = {}
+
+    def money(self, value):
+        """
+        Converts an aggregated amount to rubles.
+
+        Args:
+            value (int or float): An amount in the aggregator's unit.
+
+        Returns:
+            float: The amount in rubles.
+        """
+        return to_rubles(value) if self.kopecks else value
+
+    def _new_bucket(self) -> dict:
+        return {"income": 0, "expenses": 0,
+                "categories": SpaceSaving(self.top_k) if self.sketch else {}}
+
+    def _observe(self, cat: str, spent: float):
+        stats = self.category_stats.get(cat)
+        if stats is None:
+            stats = self.category_stats[cat] = RunningStats()
+            self.category_quantiles[cat] = QuantileSketch()
+        stats.update(spent)
+        self.category_quantiles[cat].update(spent)
+
+    def update(self, transactions) -> "Aggregator":
+        """
+        Folds transactions into the running aggregates.
+
+        Args:
+            transactions (iterable): Categorized transaction records or dictionaries.
+
+        Returns:
+            Aggregator: The aggregator itself, to allow chaining.
+        """
+        no_category = f'{lcl.NO_CATEGORY}'
+        categories = self.categories
+        category_expenses = self.category_expenses
+        sketch = self.sketch
+        for t in transactions:
+            if t.__class__ is Transaction:
+                amount = t.amount
+                cat = getattr(t, "category", no_category)
+            else:
+                amount = t["amount"]
+                cat = t.get("category", no_category)
+            self.transaction_count += 1
+            if amount > 0:
+                self.total_income += amount
+                self.income_transactions += 1
+            elif amount < 0:
+                self.total_expense += amount
+                self.expense_transactions += 1
+                category_expenses[cat] = category_expenses.get(cat, 0) + abs(amount)
+                if sketch:
+                    self._observe(cat, abs(amount))
+            totals = categories.get(cat)
+            if totals is None:
+                totals = categories[cat] = {"sum": 0, "count": 0}
+            totals["sum"] += amount
+            totals["count"] += 1
+
+            fields = date_fields(t)
+            if fields is None:
+                self.invalid_dates += 1
+                continue
+            _, year, month_number, quarter_number = fields
+            month = f"{year}-{month_number:02d}"
+            quarter = f"{year}-Q{quarter_number}"
+            for buckets, key in ((self.months, month), (self.quarters, quarter)):
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = self._new_bucket()
+                if amount >= 0:
+                    bucket["income"] += amount
+                else:
+                    bucket["expenses"] += amount
+                    counts = bucket["categories"]
+                    if sketch:
+                        counts.update(cat)
+                    else:
+                        counts[cat] = counts.get(cat, 0) + 1
+            if amount < 0:
+                spending = self.category_months.get(cat)
+                if spending is None:
+                    spending = self.category_months[cat] = {}
+                spending[month] = spending.get(month, 0) + abs(amount)
+        return self
+
+    def merge(self, other: "Aggregator") -> "Aggregator":
+        """
+        Folds the aggregates of a later chunk of transactions into this one.
+
+        Keys new to this aggregator are appended in the other aggregator's order, so
+        merging partial results in chunk order keeps the first-appearance ordering.
+
+        An empty aggregator takes over the mode and unit of the first one merged into it.
+
+        Args:
+            other (Aggregator): Aggregates of transactions that follow this one's.
+
+        Returns:
+            Aggregator: The aggregator itself, to allow chaining.
+
+        Raises:
+            ValueError: If exact aggregates are merged with sketch aggregates, or
+                ruble aggregates with kopeck aggregates.
+        """
+        if other.sketch != self.sketch:
+            if self.transaction_count:
+                raise ValueError("cannot merge exact and sketch aggregates")
+            self.sketch, self.top_k = other.sketch, other.top_k
+        if other.kopecks != self.kopecks and other.transaction_count:
+            if self.transaction_count:
+                raise ValueError("cannot merge ruble and kopeck aggregates")
+            self.kopecks = other.kopecks
+        self.total_income += other.total_income
+        self.total_expense += other.total_expense
+        self.transaction_count += other.transaction_count
+        self.income_transactions += other.income_transactions
+        self.expense_transactions += other.expense_transactions
+        self.invalid_dates += other.invalid_dates
+        for cat, val in other.categories.items():
+            totals = self.categories.setdefault(cat, {"sum": 0, "count": 0})
+            totals["sum"] += val["sum"]
+            totals["count"] += val["count"]
+        for cat, spent in other.category_expenses.items():
+            self.category_expenses[cat] = self.category_expenses.get(cat, 0) + spent
+        for buckets, other_buckets in ((self.months, other.months),
+                                       (self.quarters, other.quarters)):
+            for key, val in other_buckets.items():
+                bucket = buckets.get(key)
+                if bucket is None:
+                    bucket = buckets[key] = self._new_bucket()
+                bucket["income"] += val["income"]
+                bucket["expenses"] += val["expenses"]
+                counts = bucket["categories"]
+                if self.sketch:
+                    counts.merge(val["categories"])
+                else:
+                    for cat, count in val["categories"].items():
+                        counts[cat] = counts.get(cat, 0) + count
+        for cat, months in other.category_months.items():
+            spending = self.category_months.setdefault(cat, {})
+            for month, spent in months.items():
+                spending[month] = spending.get(month, 0) + spent
+        for cat, stats in other.category_stats.items():
+            if cat not in self.category_stats:
+                self.category_stats[cat] = RunningStats()
+                self.category_quantiles[cat] = QuantileSketch(
+                    other.category_quantiles[cat].relative_accuracy)
+            self.category_stats[cat].merge(stats)
+            self.category_quantiles[cat].merge(other.category_quantiles[cat])
+        return self
+
+    def to_dict(self) -> dict:
+        """
+        Returns the aggregates as JSON-serializable data.
+
+        Returns:
+            dict: All running totals and buckets of the aggregator.
+        """
+        data = {name: value for name, value in vars(self).items()}
+        if self.sketch:
+            for name in ("months", "quarters"):
+                data[name] = {key: dict(bucket, categories=bucket["categories"].to_dict())
+                              for key, bucket in data[name].items()}
+            data["category_stats"] = {cat: stats.to_dict()
+                                      for cat, stats in self.category_stats.items()}
+            data["category_quantiles"] = {cat: sketch.to_dict()
+                                          for cat, sketch in self.category_quantiles.items()}
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Aggregator":
+        """
+        Restores an aggregator saved with `to_dict`.
+
+        Args:
+            data (dict): Saved aggregates.
+
+        Returns:
+            Aggregator: The restored aggregator.
+        """
+        aggregate = cls()
+        for name in vars(aggregate):
+            if name in data:
+                setattr(aggregate, name, data[name])
+        aggregate.kopecks = bool(aggregate.kopecks)
+        if aggregate.sketch:
+            for name in ("months", "quarters"):
+                setattr(aggregate, name, {
+                    key: dict(bucket, categories=SpaceSaving.from_dict(bucket["categories"]))
+                    for key, bucket in data[name].items()})
+            aggregate.category_stats = {cat: RunningStats.from_dict(stats)
+                                        for cat, stats in data["category_stats"].items()}
+            aggregate.category_quantiles = {cat: QuantileSketch.from_dict(sketch)
+                                            for cat, sketch in data["category_quantiles"].items()}
+        return aggregate
+
+
+def aggregate_transactions(transactions, sketch: bool = False,
+                           kopecks: bool = False) -> Aggregator:
+    """
+    Aggregates transactions in a single pass.
+
+    Columnar tables (see `table.TransactionTable`) provide their own vectorized
+    `aggregate` method, which is used instead of the row loop; they know their unit.
+
+    Args:
+        transactions (iterable): Categorized transaction dictionaries or a columnar table.
+        sketch (bool): Build a sketch-mode aggregator. Defaults to False.
+        kopecks (bool): Amounts are integer kopecks. Defaults to False (rubles).
+
+    Returns:
+        Aggregator: The filled aggregator.
+    """
+    aggregate = getattr(transactions, "aggregate", None)
+    if aggregate is not None:
+        return aggregate(sketch=sketch)
+    return Aggregator(sketch=sketch, kopecks=kopecks).update(transactions)
+
+
+_PERIOD_NEEDS_TRANSACTIONS = ("a report period needs the transactions: precomputed "
+                              "aggregates cover the whole history")
+
+
+def _resolve(transactions, aggregate: Aggregator, start, end, kopecks: bool) -> Aggregator:
+    """
+    Returns the aggregates to report on, restricted to [start, end] if a range is given.
+
+    A range is selected with `data.select_range`: a `TimeIndex` answers it with two
+    binary searches, a list is scanned.
+    """
+    if start is None and end is None:
+        return (aggregate if aggregate is not None
+                else aggregate_transactions(transactions, kopecks=kopecks))
+    if transactions is None:
+        raise ValueError(_PERIOD_NEEDS_TRANSACTIONS)
+    if aggregate is not None:
+        kopecks = aggregate.kopecks
+    return aggregate_transactions(select_range(transactions, start, end),
+                                  sketch=aggregate is not None and aggregate.sketch,
+                                  kopecks=kopecks)
+
+
+def _periodic_report(buckets: dict, money) -> dict:
+    report = {}
+    for key, bucket in buckets.items():
+        counts = bucket["categories"]
+        if isinstance(counts, SpaceSaving):
+            top = counts.most_common(3)
+            counts = counts.counts
+        else:
+            top = Counter(counts).most_common(3)
+        report[key] = {
+            "income": money(bucket["income"]),
+            "expenses": money(bucket["expenses"]),
+            "categories": dict(counts),
+            "top_categories": top
+        }
+    return report
+
+
+def calculate_basic_stats(transactions: list, aggregate: Aggregator = None,
+                          start=None, end=None, kopecks: bool = False) -> dict:
     """
     Calculates basic financial statistics from a list of transactions.
 
     Args:
         transactions (list): List of transaction dictionaries.
+        aggregate (Aggregator, optional): Precomputed aggregates of the transactions.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to analyze.
+        end (str, optional): Last day of the period to analyze. With a period the
+            aggregates are recomputed from the transactions dated within it, which
+            a `time_index.TimeIndex` finds by binary search.
+        kopecks (bool): The transactions carry integer kopecks. Only used when the
+            aggregates are computed here. Defaults to False (rubles).
 
     Returns:
         dict: A dictionary containing total income, total expense, balance,
               transaction count, income transaction count, expense transaction count.
+
+    Raises:
+        ValueError: If a period is given without the transactions.
     """
-    total_income = sum(t["amount"] for t in transactions if t["amount"] > 0)
-    total_expense = sum(t["amount"] for t in transactions if t["amount"] < 0)
-    balance = total_income + total_expense
-    transaction_count = len(transactions)
-    count_income = sum(1 for t in transactions if t["amount"] > 0)
-    count_expense = sum(1 for t in transactions if t["amount"] < 0)
+    aggregate = _resolve(transactions, aggregate, start, end, kopecks)
+    money = aggregate.money
     return {
-        "total_income": total_income,
-        "total_expense": total_expense,
-        "balance": balance,
-        "transaction_count": transaction_count,
-        "income_transactions": count_income,
-        "expense_transactions": count_expense
+        "total_income": money(aggregate.total_income),
+        "total_expense": money(aggregate.total_expense),
+        "balance": money(aggregate.total_income + aggregate.total_expense),
+        "transaction_count": aggregate.transaction_count,
+        "income_transactions": aggregate.income_transactions,
+        "expense_transactions": aggregate.expense_transactions
     }
 
 
-def calculate_by_category(transactions: list) -> dict:
+def calculate_by_category(transactions: list, aggregate: Aggregator = None,
+                          start=None, end=None, kopecks: bool = False) -> dict:
     """
     Calculates total amounts and percentages per category from transactions.
 
     Args:
         transactions (list): List of transaction dictionaries, each with a 'category'.
+        aggregate (Aggregator, optional): Precomputed aggregates of the transactions.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to analyze.
+        end (str, optional): Last day of the period to analyze. With a period the
+            aggregates are recomputed from the transactions dated within it, which
+            a `time_index.TimeIndex` finds by binary search.
+        kopecks (bool): The transactions carry integer kopecks. Only used when the
+            aggregates are computed here. Defaults to False (rubles).
 
     Returns:
         dict: Sorted dictionary with categories as keys and dicts with sum, count, and percent.
+
+    Raises:
+        ValueError: If a period is given without the transactions.
     """
-    totals = defaultdict(lambda: {"sum": 0, "count": 0})
-    total_expense = sum(t["amount"] for t in transactions if t["amount"] < 0)
-    for t in transactions:
-        cat = t.get("category", f'{lcl.NO_CATEGORY}')
-        totals[cat]["sum"] += t["amount"]
-        totals[cat]["count"] += 1
-    for cat, val in totals.items():
-        val["percent"] = (-val["sum"] / -total_expense * 100) if total_expense else 0
+    aggregate = _resolve(transactions, aggregate, start, end, kopecks)
+    total_expense = aggregate.total_expense
+    totals = {}
+    for cat, val in aggregate.categories.items():
+        totals[cat] = {
+            "sum": val["sum"],
+            "count": val["count"],
+            "percent": (-val["sum"] / -total_expense * 100) if total_expense else 0
+        }
     sorted_categories = sorted(totals.items(), key=lambda item: abs(item[1]["sum"]), reverse=True)
+    for _, val in sorted_categories:
+        val["sum"] = aggregate.money(val["sum"])
     return dict(sorted_categories)
 
 
-def analyze_by_time(transactions: list) -> dict:
+def analyze_by_time(transactions: list, aggregate: Aggregator = None,
+                    start=None, end=None, kopecks: bool = False) -> dict:
     """
     Analyzes transactions grouped by month, summarizing income, expenses, and top categories.
 
     Args:
         transactions (list): List of transaction dictionaries.
+        aggregate (Aggregator, optional): Precomputed aggregates of the transactions.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to analyze.
+        end (str, optional): Last day of the period to analyze. With a period the
+            aggregates are recomputed from the transactions dated within it, which
+            a `time_index.TimeIndex` finds by binary search.
+        kopecks (bool): The transactions carry integer kopecks. Only used when the
+            aggregates are computed here. Defaults to False (rubles).
 
     Returns:
-        dict: Dictionary with month keys, each containing income, expenses, and top categories.
-    """
-    monthly = defaultdict(lambda: {"income": 0, "expenses": 0, "categories": []})
-    for t in transactions:
-        try:
-            d = datetime.datetime.strptime(t["date"], "%Y-%m-%d")
-        except Exception:
-            continue
-        key = d.strftime("%Y-%m")
-        if t["amount"] >= 0:
-            monthly[key]["income"] += t["amount"]
-        else:
-            monthly[key]["expenses"] += t["amount"]
-            monthly[key]["categories"].append(t.get("category", f'{lcl.NO_CATEGORY}'))
-    for m, data in monthly.items():
-        data["top_categories"] = Counter(data["categories"]).most_common(3)
-    return dict(monthly)
+        dict: Dictionary with month keys, each containing income, expenses, the number
+        of expenses per category and the top categories.
+
+    Raises:
+        ValueError: If a period is given without the transactions.
+    """
+    aggregate = _resolve(transactions, aggregate, start, end, kopecks)
+    return _periodic_report(aggregate.months, aggregate.money)
 
 
-def analyze_seasonal_trends(transactions: list) -> dict:
+def analyze_seasonal_trends(transactions: list, aggregate: Aggregator = None,
+                            start=None, end=None, kopecks: bool = False) -> dict:
     """
     Analyzes transactions grouped by fiscal quarter, summarizing income, expenses, and top categories.
 
     Args:
         transactions (list): List of transaction dictionaries.
+        aggregate (Aggregator, optional): Precomputed aggregates of the transactions.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to analyze.
+        end (str, optional): Last day of the period to analyze. With a period the
+            aggregates are recomputed from the transactions dated within it, which
+            a `time_index.TimeIndex` finds by binary search.
+        kopecks (bool): The transactions carry integer kopecks. Only used when the
+            aggregates are computed here. Defaults to False (rubles).
 
     Returns:
-        dict: Dictionary with quarter keys, each containing income, expenses, and top categories.
-    """
-    quarterly = defaultdict(lambda: {"income": 0, "expenses": 0, "categories": []})
-    for t in transactions:
-        try:
-            d = datetime.datetime.strptime(t["date"], "%Y-%m-%d")
-        except Exception:
-            continue
-        year = d.year
-        quarter = (d.month - 1) // 3 + 1
-        key = f"{year}-Q{quarter}"
-        amount = t["amount"]
-        if amount >= 0:
-            quarterly[key]["income"] += amount
-        else:
-            quarterly[key]["expenses"] += amount
-            category = t.get("category", f'{lcl.NO_CATEGORY}')
-            quarterly[key]["categories"].append(category)
-    for q, data in quarterly.items():
-        data["top_categories"] = Counter(data["categories"]).most_common(3)
-    return dict(quarterly)
+        dict: Dictionary with quarter keys, each containing income, expenses, the number
+        of expenses per category and the top categories.
 
-def analyze_historical_spending(transactions: list) -> dict:
+    Raises:
+        ValueError: If a period is given without the transactions.
+    """
+    aggregate = _resolve(transactions, aggregate, start, end, kopecks)
+    return _periodic_report(aggregate.quarters, aggregate.money)
+
+def analyze_historical_spending(transactions: list, aggregate: Aggregator = None,
+                                start=None, end=None, kopecks: bool = False) -> dict:
     """
     Calculates average monthly spending per category and identifies top categories.
 
     Args:
         transactions (list): List of transaction dictionaries.
+        aggregate (Aggregator, optional): Precomputed aggregates of the transactions.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to analyze.
+        end (str, optional): Last day of the period to analyze. With a period the
+            aggregates are recomputed from the transactions dated within it, which
+            a `time_index.TimeIndex` finds by binary search.
+        kopecks (bool): The transactions carry integer kopecks. Only used when the
+            aggregates are computed here. Defaults to False (rubles).
 
     Returns:
         dict: Contains 'average_spending' per category and 'top_categories' list.
+
+    Raises:
+        ValueError: If a period is given without the transactions.
     """
-    monthly_spending = defaultdict(lambda: defaultdict(float))
-    for t in transactions:
-        if t["amount"] < 0:
-            try:
-                d = datetime.datetime.strptime(t["date"], "%Y-%m-%d")
-            except Exception:
-                continue
-            month = d.strftime("%Y-%m")
-            cat = t.get("category", f'{lcl.NO_CATEGORY}')
-            monthly_spending[cat][month] += abs(t["amount"])
-    avg_spending = {
-        cat: round(statistics.mean(vals.values()), 2)
-        for cat, vals in monthly_spending.items() if vals
-    }
+    aggregate = _resolve(transactions, aggregate, start, end, kopecks)
+    if aggregate.kopecks:
+        avg_spending = {
+            cat: to_rubles(divide_kopecks(sum(vals.values()), len(vals)))
+            for cat, vals in aggregate.category_months.items() if vals
+        }
+    else:
+        avg_spending = {
+            cat: round(statistics.mean(vals.values()), 2)
+            for cat, vals in aggregate.category_months.items() if vals
+        }
     top_cats = sorted(avg_spending.items(), key=lambda x: x[1], reverse=True)[:3]
     return {
         "average_spending": avg_spending,
         "top_categories": top_cats
     }
+
+
+def analyze_spending_distribution(transactions: list, aggregate: Aggregator = None,
+                                  start=None, end=None,
+                                  quantiles=(0.5, 0.9, 0.99), kopecks: bool = False) -> dict:
+    """
+    Describes the distribution of expense amounts per category.
+
+    The statistics come from the sketches of a sketch-mode aggregator, so medians and
+    percentiles are approximate (within 1% relative error). Without such an aggregator
+    the transactions are aggregated in sketch mode first.
+
+    Args:
+        transactions (list): List of transaction dictionaries.
+        aggregate (Aggregator, optional): Precomputed sketch-mode aggregates.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to analyze.
+        end (str, optional): Last day of the period to analyze.
+        quantiles (iterable): Quantiles to estimate. Defaults to the median, the
+            90th and the 99th percentiles.
+        kopecks (bool): The transactions carry integer kopecks. Only used when the
+            aggregates are computed here. Defaults to False (rubles).
+
+    Returns:
+        dict: Categories mapped to 'count', 'mean', 'stdev', 'min', 'max' and
+        'quantiles' (quantile mapped to amount) of their expenses.
+
+    Raises:
+        ValueError: If neither transactions nor sketch-mode aggregates are given.
+    """
+    if aggregate is None or not aggregate.sketch:
+        if transactions is None:
+            raise ValueError("the spending distribution needs transactions "
+                             "or sketch-mode aggregates")
+        aggregate = aggregate_transactions(transactions if start is None and end is None
+                                           else select_range(transactions, start, end),
+                                           sketch=True, kopecks=kopecks)
+    else:
+        aggregate = _resolve(transactions, aggregate, start, end, kopecks)
+    money = aggregate.money
+    return {
+        cat: {
+            "count": stats.count,
+            "mean": money(stats.mean),
+            "stdev": money(stats.stdev),
+            "min": money(stats.minimum),
+            "max": money(stats.maximum),
+            "quantiles": {q: money(aggregate.category_quantiles[cat].quantile(q))
+                          for q in quantiles}
+        }
+        for cat, stats in aggregate.category_stats.items()
+    }
@@ -0,0 +1,70 @@
+"""
+Compares the rows per second of data.read_csv_file and table.read_csv_table.
+
+The input is generated by cycling the rows of money.csv with shifted dates.
+
+Usage:
+    python benchmarks/bench_csv.py [--rows N] [--path FILE] [--keep]
+"""
+import argparse
+import csv
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data import read_csv_file  # noqa: E402
+from table import read_csv_table  # noqa: E402
+
+
+def generate_csv(path: str, rows: int):
+    """
+    Writes `rows` transactions built from the sample statement to `path`.
+    """
+    with open(os.path.join(ROOT, "money.csv"), encoding='utf-8') as file:
+        sample = list(csv.DictReader(file))
+    start = datetime.date(2015, 1, 1).toordinal()
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["date", "description", "amount", "type"])
+        for i in range(rows):
+            row = sample[i % len(sample)]
+            date = datetime.date.fromordinal(start + (i * 3650) // rows).isoformat()
+            writer.writerow([date, row["description"], row["amount"], row["type"]])
+
+
+def measure(name: str, reader, path: str, rows: int):
+    start = time.perf_counter()
+    result = reader(path)
+    elapsed = time.perf_counter() - start
+    assert len(result) == rows, (name, len(result))
+    print(f"{name:<16} {elapsed:>8.2f} s {rows / elapsed:>14,.0f} rows/s")
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--path", default=None, help="CSV file to use or create")
+    parser.add_argument("--keep", action="store_true", help="keep the generated file")
+    args = parser.parse_args(argv)
+    path = args.path or os.path.join(tempfile.gettempdir(), f"bench_{args.rows}.csv")
+    generated = not os.path.exists(path)
+    if generated:
+        print(f"generating {args.rows:,} rows into {path}")
+        generate_csv(path, args.rows)
+    try:
+        slow = measure("read_csv_file", read_csv_file, path, args.rows)
+        fast = measure("read_csv_table", read_csv_table, path, args.rows)
+        print(f"speedup          {slow / fast:>8.2f}x")
+    finally:
+        if generated and not args.keep and not args.path:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
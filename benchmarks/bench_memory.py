@@ -0,0 +1,92 @@
+"""
+Compares the memory per transaction of plain dictionaries and data.Transaction records.
+
+Three readers load the same CSV file and are categorized before measuring: the
+original four-key dictionaries (five keys with the category) built the way the
+readers did before the parsed date fields were added, the current default
+dictionaries of data.read_csv_file, and the records of `records=True`. The
+reduction is reported against both dictionary layouts.
+
+Usage:
+    python benchmarks/bench_memory.py [--rows N] [--path FILE] [--keep]
+"""
+import argparse
+import csv
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import local as lcl  # noqa: E402
+from bench_csv import generate_csv  # noqa: E402
+from categories import categorize_all_transactions  # noqa: E402
+from data import read_csv_file  # noqa: E402
+
+
+def read_original(filename: str) -> list:
+    """
+    Reads a CSV file into the four-key dictionaries of the original reader.
+    """
+    data = []
+    with open(filename, 'r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            amount = float(row.get('amount', 0))
+            data.append({
+                'date': row.get('date', '').strip(),
+                'amount': amount,
+                'description': row.get('description', '').strip(),
+                'type': f'{lcl.INCOME_LABEL}' if amount >= 0 else f'{lcl.EXPENSE_LABEL}'
+            })
+    return data
+
+
+def read_records(filename: str) -> list:
+    """
+    Reads a CSV file into one Transaction record per transaction.
+    """
+    return read_csv_file(filename, records=True)
+
+
+def measure(name: str, reader, path: str, rows: int):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = categorize_all_transactions(reader(path))
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert len(result) == rows, (name, len(result))
+    print(f"{name:<16} {size / rows:>8.0f} B/row {size / 2 ** 20:>10.1f} MiB {elapsed:>8.2f} s")
+    del result
+    return size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--path", default=None, help="CSV file to use or create")
+    parser.add_argument("--keep", action="store_true", help="keep the generated file")
+    args = parser.parse_args(argv)
+    path = args.path or os.path.join(tempfile.gettempdir(), f"bench_{args.rows}.csv")
+    generated = not os.path.exists(path)
+    if generated:
+        print(f"generating {args.rows:,} rows into {path}")
+        generate_csv(path, args.rows)
+    try:
+        original = measure("dict (original)", read_original, path, args.rows)
+        dicts = measure("dict", read_csv_file, path, args.rows)
+        records = measure("Transaction", read_records, path, args.rows)
+        print(f"reduction        {original / records:>8.2f}x vs original, "
+              f"{dicts / records:.2f}x vs dict")
+    finally:
+        if generated and not args.keep and not args.path:
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
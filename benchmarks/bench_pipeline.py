@@ -0,0 +1,175 @@
+"""
+Times every stage of the smart piggy bank pipeline on synthetic statements.
+
+For each size a CSV and a JSON statement are generated, then every stage is timed
+separately and the whole report end to end. Each stage is then run a second time
+under tracemalloc to record its peak allocation (skipped with --no-memory), so the
+timings themselves never pay for tracing.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--sizes N ...] [--repeat N] [--no-memory] [--output FILE]
+                                        [--compare BASELINE] [--threshold R]
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import analytics  # noqa: E402
+import budget  # noqa: E402
+from categories import CategoryCache, categorize_all_transactions  # noqa: E402
+from data import import_financial_data  # noqa: E402
+from main import smart_piggy_bank  # noqa: E402
+from synthetic import write_statement  # noqa: E402
+from vizualization import visualize_financial_data  # noqa: E402
+
+DEFAULT_SIZES = (10_000, 1_000_000, 10_000_000)
+ANALYTICS = ("calculate_basic_stats", "calculate_by_category", "analyze_by_time",
+             "analyze_seasonal_trends", "analyze_historical_spending")
+MIN_SECONDS = 0.01
+
+
+def stages(csv_path: str, json_path: str, plot_path: str) -> list:
+    """
+    Returns (name, function) pairs; every function reads and fills a shared context dict.
+    """
+    def import_csv(ctx):
+        ctx["csv"] = import_financial_data(csv_path)
+
+    def import_json(ctx):
+        ctx["json"] = import_financial_data(json_path)
+
+    def categorize(ctx):
+        ctx["transactions"] = categorize_all_transactions(ctx["csv"] + ctx["json"],
+                                                          cache=CategoryCache())
+
+    def aggregate(ctx):
+        ctx["aggregate"] = analytics.aggregate_transactions(ctx["transactions"])
+
+    def analytics_stage(name):
+        def run(ctx):
+            ctx[name] = getattr(analytics, name)(ctx["transactions"])
+        return run
+
+    def create_budget(ctx):
+        ctx["budget"] = budget.create_budget_template(
+            ctx["analyze_historical_spending"], ctx["calculate_basic_stats"]["total_income"])
+
+    def compare_budget(ctx):
+        budget.compare_budget_vs_actual(ctx["budget"], ctx["transactions"])
+
+    def plot(ctx):
+        visualize_financial_data(ctx["transactions"], ctx["aggregate"], output=plot_path)
+
+    def end_to_end(ctx):
+        with contextlib.redirect_stdout(io.StringIO()):
+            smart_piggy_bank(csv_path, json_path, plot_file=plot_path)
+
+    return ([("import_csv", import_csv), ("import_json", import_json),
+             ("categorize_all_transactions", categorize), ("aggregate", aggregate)]
+            + [(name, analytics_stage(name)) for name in ANALYTICS]
+            + [("create_budget_template", create_budget),
+               ("compare_budget_vs_actual", compare_budget),
+               ("visualize_financial_data", plot), ("end_to_end", end_to_end)])
+
+
+def run_size(rows: int, workdir: str, memory: bool, repeat: int = 3) -> dict:
+    """
+    Generates statements of `rows` transactions each and measures every stage.
+
+    The reported time is the best of `repeat` runs, which filters out most noise.
+    """
+    csv_path = os.path.join(workdir, f"statement_{rows}.csv")
+    json_path = os.path.join(workdir, f"statement_{rows}.json")
+    plot_path = os.path.join(workdir, "chart.png")
+    write_statement(csv_path, rows, seed=1)
+    write_statement(json_path, rows, seed=2)
+    results = {}
+    ctx = {}
+    for name, stage in stages(csv_path, json_path, plot_path):
+        seconds = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            stage(ctx)
+            seconds = min(seconds, time.perf_counter() - start)
+        result = {"seconds": round(seconds, 6)}
+        if memory:
+            tracemalloc.start()
+            stage(ctx)
+            result["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 3)
+            tracemalloc.stop()
+        results[name] = result
+        print(f"{rows:>10,} {name:<30} {seconds:>10.3f} s"
+              + (f" {result['peak_mb']:>10.1f} MB" if memory else ""))
+    for path in (csv_path, json_path):
+        os.remove(path)
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """
+    Prints time ratios against a baseline and returns the number of regressions.
+
+    Stages that took less than MIN_SECONDS in the baseline are too noisy to compare.
+    """
+    regressions = 0
+    for size, size_results in results.items():
+        for name, result in size_results.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if not base or base.get("seconds", 0) < MIN_SECONDS:
+                continue
+            ratio = result["seconds"] / base["seconds"]
+            flag = ""
+            if ratio > threshold:
+                regressions += 1
+                flag = "  REGRESSION"
+            print(f"{int(size):>10,} {name:<30} {ratio:>8.2f}x{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, best is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc runs")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="baseline JSON file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio reported as a regression")
+    args = parser.parse_args(argv)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for rows in args.sizes:
+            results[str(rows)] = run_size(rows, workdir, not args.no_memory, args.repeat)
+    report = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sizes": args.sizes,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Measures the import cost `python main.py` pays before any work is done.
+
+"eager" imports matplotlib.pyplot together with main, the way vizualization.py did
+at module load before the import was deferred; "lazy" imports main alone.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "eager": "import matplotlib.pyplot; import main",
+    "lazy": "import main; import sys; assert 'matplotlib' not in sys.modules",
+}
+
+
+def time_import(code: str, runs: int) -> list:
+    """
+    Runs `code` in fresh interpreters and returns the wall times in milliseconds.
+    """
+    env = dict(os.environ, MPLBACKEND="Agg")
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+    time_import("pass", 1)
+    baseline = statistics.median(time_import("pass", args.runs))
+    print(f"{'scenario':<8} {'median ms':>10} {'import ms':>10}")
+    print(f"{'python':<8} {baseline:>10.1f} {0:>10.1f}")
+    for name, code in SCENARIOS.items():
+        median = statistics.median(time_import(code, args.runs))
+        print(f"{name:<8} {median:>10.1f} {median - baseline:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
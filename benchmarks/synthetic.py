@@ -0,0 +1,141 @@
+"""
+Synthetic statement generator for benchmarks.
+
+Descriptions are built from the category keywords in local.py (through
+categories.all_categories), so the generated rows exercise the real categorizer.
+
+Usage:
+    python benchmarks/synthetic.py OUTPUT.csv|OUTPUT.json [--rows N] [--start DATE]
+                                   [--days N] [--mix CATEGORY=WEIGHT ...] [--seed N]
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import local as lcl  # noqa: E402
+from categories import all_categories  # noqa: E402
+
+INCOME_CATEGORIES = (f'{lcl.SALARY_AND_INCOME}', f'{lcl.DEPOSIT_INVESTMENTS}')
+UNCATEGORIZED = ("Аренда квартиры", "Перевод по номеру телефона", "Снятие наличных",
+                 "Оплата по QR-коду", "Комиссия банка")
+SUFFIXES = ("", "", " Москва", " онлайн", " СПб", " ООО", " №{n}", " {month}")
+MONTHS = ("январь", "февраль", "март", "апрель", "май", "июнь", "июль", "август",
+          "сентябрь", "октябрь", "ноябрь", "декабрь")
+
+
+def default_mix() -> dict:
+    """
+    Returns equal weights for every category plus uncategorized descriptions.
+    """
+    mix = {cat: 1.0 for cat in all_categories()}
+    mix[f'{lcl.OTHER}'] = 1.0
+    return mix
+
+
+def generate_transactions(rows: int, start: datetime.date = datetime.date(2020, 1, 1),
+                          days: int = 365 * 3, mix: dict = None, seed: int = 0):
+    """
+    Yields synthetic transactions in date order.
+
+    Args:
+        rows (int): Number of transactions.
+        start (datetime.date): First day of the statement.
+        days (int): Number of days the statement spans.
+        mix (dict, optional): Category weights; 'другое' stands for descriptions
+            that match no keyword. Defaults to `default_mix()`.
+        seed (int): Random seed, for reproducible files.
+
+    Yields:
+        dict: Raw records with 'date', 'description', 'amount' and 'type'.
+    """
+    rng = random.Random(seed)
+    keywords = all_categories()
+    mix = mix or default_mix()
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    first = start.toordinal()
+    batch = 4096
+    for offset in range(0, rows, batch):
+        picks = rng.choices(names, weights, k=min(batch, rows - offset))
+        for i, cat in enumerate(picks, offset):
+            day = datetime.date.fromordinal(first + (i * days) // max(rows, 1))
+            if cat in keywords:
+                word = rng.choice(keywords[cat])
+                description = word[:1].upper() + word[1:]
+            else:
+                description = rng.choice(UNCATEGORIZED)
+            description += rng.choice(SUFFIXES).format(n=rng.randint(1, 999),
+                                                       month=MONTHS[day.month - 1])
+            if cat in INCOME_CATEGORIES:
+                amount = round(rng.uniform(5000, 120000), 2)
+            else:
+                amount = -round(rng.lognormvariate(7, 1.1), 2)
+            yield {
+                "date": day.isoformat(),
+                "description": description,
+                "amount": amount,
+                "type": f'{lcl.INCOME_LABEL}' if amount >= 0 else f'{lcl.EXPENSE_LABEL}'
+            }
+
+
+def write_csv(path: str, transactions):
+    """
+    Writes transactions in the layout of money.csv.
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["date", "description", "amount", "type"])
+        for t in transactions:
+            writer.writerow([t["date"], t["description"], f"{t['amount']:.2f}", t["type"]])
+
+
+def write_json(path: str, transactions):
+    """
+    Writes transactions in the layout of transactions.json, one item at a time.
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('{\n  "transactions": [\n')
+        for i, t in enumerate(transactions):
+            if i:
+                file.write(',\n')
+            file.write('    ' + json.dumps(t, ensure_ascii=False))
+        file.write('\n  ]\n}\n')
+
+
+def write_statement(path: str, rows: int, **options):
+    """
+    Generates a statement and writes it as CSV or JSON depending on the extension.
+    """
+    writer = write_json if path.lower().endswith(".json") else write_csv
+    writer(path, generate_transactions(rows, **options))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic bank statement")
+    parser.add_argument("output", help="output .csv or .json file")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--start", default="2020-01-01", help="first day (YYYY-MM-DD)")
+    parser.add_argument("--days", type=int, default=365 * 3, help="number of days spanned")
+    parser.add_argument("--mix", nargs="+", default=None, metavar="CATEGORY=WEIGHT",
+                        help="category weights; unspecified categories get weight 0")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    mix = None
+    if args.mix:
+        mix = {}
+        for item in args.mix:
+            cat, _, weight = item.rpartition("=")
+            mix[cat] = float(weight)
+    write_statement(args.output, args.rows, start=datetime.date.fromisoformat(args.start),
+                    days=args.days, mix=mix, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
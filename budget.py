@@ -1,47 +1,83 @@
-from collections import defaultdict, Counter
 import local as lcl
+from analytics import Aggregator, aggregate_transactions
+from data import date_fields, select_range
+from money import divide_kopecks, to_kopecks, to_rubles
 
 
-def create_budget_template(analysis: dict, total_income: float = None) -> dict:
+def create_budget_template(analysis: dict, total_income: float = None,
+                           kopecks: bool = False) -> dict:
     """
     Creates a budget template based on historical analysis and total income.
 
     Args:
         analysis (dict): The output of historical spending analysis.
         total_income (float, optional): Total income for computations. Defaults to None.
+        kopecks (bool): Compute the limits in exact integer kopecks, rounding half
+            away from zero, instead of with float arithmetic. Defaults to False.
 
     Returns:
         dict: Budget limits and recommended amounts per category.
     """
     avg_spending = analysis.get("average_spending", {})
-    total_expenses = sum(avg_spending.values())
-    savings = round((total_income * 0.15 if total_income else total_expenses * 0.1), 2)
-    budget = {cat: {"limit": round(val * 1.05, 2), "recommended": val}
-              for cat, val in avg_spending.items()}
+    if kopecks:
+        avg_kopecks = {cat: to_kopecks(val) for cat, val in avg_spending.items()}
+        if total_income:
+            savings = to_rubles(divide_kopecks(to_kopecks(total_income) * 15, 100))
+        else:
+            savings = to_rubles(divide_kopecks(sum(avg_kopecks.values()) * 10, 100))
+        budget = {cat: {"limit": to_rubles(divide_kopecks(val * 105, 100)),
+                        "recommended": avg_spending[cat]}
+                  for cat, val in avg_kopecks.items()}
+    else:
+        total_expenses = sum(avg_spending.values())
+        savings = round((total_income * 0.15 if total_income else total_expenses * 0.1), 2)
+        budget = {cat: {"limit": round(val * 1.05, 2), "recommended": val}
+                  for cat, val in avg_spending.items()}
     budget[f'{lcl.SAVINGS}'] = {"limit": savings, "recommended": savings}
     return budget
 
 
-def compare_budget_vs_actual(budget: dict, transactions: list) -> dict:
+def compare_budget_vs_actual(budget: dict, transactions: list,
+                             aggregate: Aggregator = None, start=None, end=None,
+                             kopecks: bool = False) -> dict:
     """
     Compares actual spending against the budget limits for each category.
 
     Args:
         budget (dict): Budget template with limits.
         transactions (list): List of transactions with categories and amounts.
+        aggregate (Aggregator, optional): Precomputed aggregates of the transactions.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to compare.
+        end (str, optional): Last day of the period to compare.
+        kopecks (bool): The transactions carry integer kopecks. Only used when the
+            aggregates are computed here. Defaults to False (rubles).
 
     Returns:
         dict: Report with actual spending, limits, differences, and status indicators.
+
+    Raises:
+        ValueError: If a period is given without the transactions.
     """
-    actual = defaultdict(float)
-    for t in transactions:
-        if t["amount"] < 0:
-            actual[t["category"]] += abs(t["amount"])
+    if start is not None or end is not None:
+        if transactions is None:
+            raise ValueError("a budget period needs the transactions: precomputed "
+                             "aggregates cover the whole history")
+        if aggregate is not None:
+            kopecks = aggregate.kopecks
+        aggregate = aggregate_transactions(select_range(transactions, start, end),
+                                           kopecks=kopecks)
+    elif aggregate is None:
+        aggregate = aggregate_transactions(transactions, kopecks=kopecks)
+    actual = aggregate.category_expenses
     report = {}
     for cat, data in budget.items():
         limit = data["limit"]
         spent = actual.get(cat, 0)
-        diff = limit - spent
+        if aggregate.kopecks:
+            diff = to_rubles(to_kopecks(limit) - spent)
+            spent = to_rubles(spent)
+        else:
+            diff = limit - spent
         report[cat] = {
             "limit": limit,
             "actual": spent,
@@ -49,3 +85,127 @@ def compare_budget_vs_actual(budget: dict, transactions: list) -> dict:
             "status": "\u2705" f'{lcl.WITHIN_BUDGET}' if diff >= 0 else "\u26A0" f'{lcl.BUDGET_EXCEEDED}'
         }
     return report
+
+
+class BudgetTracker:
+    """
+    Tracks spending against budget limits as transactions arrive, one at a time.
+
+    The tracker keeps one running total and one threshold position per budget
+    category, so every update is O(1) and memory does not grow with the number of
+    transactions seen. When the spending of a category reaches a threshold share of
+    its limit for the first time (in the current period), an event is emitted.
+
+    Spending is counted like `compare_budget_vs_actual` does: the absolute amounts of
+    expenses per category. Categories absent from the budget are not tracked.
+
+    Args:
+        budget (dict): Budget template, as returned by `create_budget_template`.
+        thresholds (iterable): Shares of the limit that trigger an event.
+            Defaults to 80% and 100%.
+        monthly (bool): Restart the spending totals when a transaction of a new
+            month arrives. Defaults to False (one period for the whole stream).
+        on_event (callable, optional): Called with every event as it is emitted.
+        kopecks (bool): The transactions carry integer kopecks. Limits and totals are
+            then kept in kopecks and converted to rubles in events and reports.
+    """
+
+    def __init__(self, budget: dict, thresholds=(0.8, 1.0), monthly: bool = False,
+                 on_event=None, kopecks: bool = False):
+        self.kopecks = kopecks
+        self.limits = {cat: to_kopecks(data["limit"]) if kopecks else data["limit"]
+                       for cat, data in budget.items()}
+        self.thresholds = sorted(thresholds)
+        self.monthly = monthly
+        self.on_event = on_event
+        self.period = None
+        self.reset()
+
+    def reset(self):
+        """
+        Starts a new period: clears the spending totals and the crossed thresholds.
+        """
+        self.spent = dict.fromkeys(self.limits, 0 if self.kopecks else 0.0)
+        self._next = dict.fromkeys(self.limits, 0)
+
+    def _money(self, value):
+        return to_rubles(value) if self.kopecks else value
+
+    def update(self, transaction: dict) -> list:
+        """
+        Folds one categorized transaction into the totals.
+
+        Args:
+            transaction (dict): A transaction with 'amount', 'category' and 'date'.
+
+        Returns:
+            list: Events for the thresholds crossed by this transaction, each a dict
+            with 'category', 'threshold', 'spent', 'limit', 'date' and 'status'.
+        """
+        if self.monthly:
+            fields = date_fields(transaction)
+            if fields is not None:
+                period = (fields[1], fields[2])
+                if self.period is None or period > self.period:
+                    if self.period is not None:
+                        self.reset()
+                    self.period = period
+        amount = transaction["amount"]
+        if amount >= 0:
+            return []
+        cat = transaction.get("category", f'{lcl.NO_CATEGORY}')
+        if cat not in self.spent:
+            return []
+        spent = self.spent[cat] = self.spent[cat] + abs(amount)
+        limit = self.limits[cat]
+        events = []
+        position = self._next[cat]
+        while position < len(self.thresholds) and spent >= limit * self.thresholds[position]:
+            threshold = self.thresholds[position]
+            event = {
+                "category": cat,
+                "threshold": threshold,
+                "spent": self._money(spent),
+                "limit": self._money(limit),
+                "date": transaction.get("date"),
+                "status": "\u26A0" f'{lcl.BUDGET_EXCEEDED}' if threshold >= 1
+                          else "\U0001F514" f'{lcl.BUDGET_THRESHOLD_REACHED}'
+            }
+            events.append(event)
+            if self.on_event is not None:
+                self.on_event(event)
+            position += 1
+        self._next[cat] = position
+        return events
+
+    def feed(self, transactions) -> list:
+        """
+        Updates the tracker with a stream of transactions.
+
+        Args:
+            transactions (iterable): Categorized transactions in arrival order.
+
+        Returns:
+            list: All events emitted, in order.
+        """
+        events = []
+        for t in transactions:
+            events += self.update(t)
+        return events
+
+    def report(self) -> dict:
+        """
+        Returns the current period's state in the format of `compare_budget_vs_actual`.
+        """
+        report = {}
+        for cat, limit in self.limits.items():
+            spent = self.spent[cat]
+            diff = limit - spent
+            report[cat] = {
+                "limit": self._money(limit),
+                "actual": self._money(spent),
+                "difference": self._money(diff),
+                "status": ("\u2705" f'{lcl.WITHIN_BUDGET}' if diff >= 0
+                           else "\u26A0" f'{lcl.BUDGET_EXCEEDED}')
+            }
+        return report
@@ -0,0 +1,197 @@
+from itertools import product
+import numpy as np
+import local as lcl
+from analytics import Aggregator, aggregate_transactions, analyze_historical_spending
+
+DEFAULT_SCENARIO = {"buffer": 0.05, "savings_rate": 0.15, "fallback_savings_rate": 0.10}
+
+
+def round_cents(values: np.ndarray) -> np.ndarray:
+    """
+    Rounds an array to kopecks exactly like the built-in `round(value, 2)`.
+
+    Values are scaled and rounded as a whole; only those whose scaled fraction is
+    within float error of one half, where scaling may flip the result, are rounded
+    again one by one with `round`.
+
+    Args:
+        values (np.ndarray): float64 amounts.
+
+    Returns:
+        np.ndarray: The rounded amounts.
+    """
+    scaled = values * 100
+    rounded = np.rint(scaled) / 100
+    fraction = np.abs(scaled - np.floor(scaled) - 0.5)
+    ambiguous = np.nonzero(fraction < 1e-9 * np.maximum(1.0, np.abs(scaled)))
+    if ambiguous[0].size:
+        rounded[ambiguous] = [round(value, 2) for value in values[ambiguous].tolist()]
+    return rounded
+
+
+def scenario_grid(buffers, savings_rates, fallback_savings_rate: float = 0.10,
+                  caps: dict = None) -> list:
+    """
+    Builds every combination of buffer percentage and savings rate.
+
+    Args:
+        buffers (iterable): Budget buffers over average spending, e.g. 0.05 for 5%.
+        savings_rates (iterable): Shares of the total income put into savings.
+        fallback_savings_rate (float): Share of the expenses saved when there is no income.
+        caps (dict, optional): Per-category limit caps shared by all scenarios.
+
+    Returns:
+        list: Scenario dictionaries accepted by `BudgetEngine`.
+    """
+    return [{"buffer": buffer, "savings_rate": rate,
+             "fallback_savings_rate": fallback_savings_rate, "caps": caps or {}}
+            for buffer, rate in product(buffers, savings_rates)]
+
+
+class BudgetEngine:
+    """
+    Evaluates many budget scenarios against actual spending aggregated once.
+
+    A scenario is a dictionary with a 'buffer' over the average monthly spending
+    (0.05 reproduces `create_budget_template`), a 'savings_rate' of the total income,
+    a 'fallback_savings_rate' of the expenses used without income, and optional
+    'caps' mapping categories to a maximum limit. All scenarios are evaluated in one
+    set of array operations over a scenarios x categories matrix.
+
+    The default scenario gives exactly the report of `create_budget_template`
+    followed by `budget.compare_budget_vs_actual`.
+
+    Args:
+        average_spending (dict): Average monthly spending per category, as returned
+            in 'average_spending' by `analyze_historical_spending`.
+        actual (dict): Actual spending per category (positive amounts).
+        total_income (float, optional): Total income of the period.
+    """
+
+    def __init__(self, average_spending: dict, actual: dict, total_income: float = None):
+        self.categories = list(average_spending) + [f'{lcl.SAVINGS}']
+        self.average = np.array(list(average_spending.values()), dtype=np.float64)
+        self.actual = np.array([actual.get(cat, 0) for cat in self.categories],
+                               dtype=np.float64)
+        self.total_income = total_income
+        self.total_expenses = sum(average_spending.values())
+        self._index = {cat: i for i, cat in enumerate(self.categories)}
+
+    @classmethod
+    def from_aggregate(cls, aggregate: Aggregator) -> "BudgetEngine":
+        """
+        Builds an engine from precomputed aggregates.
+
+        Args:
+            aggregate (Aggregator): Aggregates of the transactions.
+
+        Returns:
+            BudgetEngine: The engine.
+        """
+        analysis = analyze_historical_spending(None, aggregate)
+        actual = {cat: aggregate.money(val) for cat, val in aggregate.category_expenses.items()}
+        return cls(analysis["average_spending"], actual, aggregate.money(aggregate.total_income))
+
+    @classmethod
+    def from_transactions(cls, transactions, kopecks: bool = False) -> "BudgetEngine":
+        """
+        Aggregates categorized transactions and builds an engine from them.
+
+        Args:
+            transactions (list): Categorized transaction dictionaries.
+            kopecks (bool): The transactions carry integer kopecks. Defaults to False.
+
+        Returns:
+            BudgetEngine: The engine.
+        """
+        return cls.from_aggregate(aggregate_transactions(transactions, kopecks=kopecks))
+
+    def limits(self, scenarios: list) -> tuple:
+        """
+        Computes the recommended amounts and limits of every scenario.
+
+        Args:
+            scenarios (list): Scenario dictionaries; missing keys take the
+                values of `DEFAULT_SCENARIO`.
+
+        Returns:
+            tuple: (recommended, limits) float64 arrays of shape
+            (len(scenarios), len(self.categories)); the last column is savings.
+        """
+        count = len(scenarios)
+        buffers = np.array([s.get("buffer", DEFAULT_SCENARIO["buffer"]) for s in scenarios],
+                           dtype=np.float64)
+        if self.total_income:
+            rates = [s.get("savings_rate", DEFAULT_SCENARIO["savings_rate"]) for s in scenarios]
+            base = self.total_income
+        else:
+            rates = [s.get("fallback_savings_rate", DEFAULT_SCENARIO["fallback_savings_rate"])
+                     for s in scenarios]
+            base = self.total_expenses
+        savings = round_cents(base * np.array(rates, dtype=np.float64))
+        caps = np.full((count, len(self.categories)), np.inf)
+        for row, scenario in enumerate(scenarios):
+            for cat, cap in scenario.get("caps", {}).items():
+                column = self._index.get(cat)
+                if column is not None:
+                    caps[row, column] = cap
+        recommended = np.empty((count, len(self.categories)))
+        recommended[:, :-1] = self.average
+        recommended[:, -1] = savings
+        limits = np.empty_like(recommended)
+        limits[:, :-1] = round_cents(self.average * (1 + buffers[:, None]))
+        limits[:, -1] = savings
+        return recommended, np.minimum(limits, caps)
+
+    def evaluate(self, scenarios: list) -> dict:
+        """
+        Compares actual spending with the limits of every scenario.
+
+        Args:
+            scenarios (list): Scenario dictionaries.
+
+        Returns:
+            dict: 'categories' (list) and float64 'limit', 'difference' and boolean
+            'within' arrays of shape (len(scenarios), len(categories)), plus
+            'exceeded', the number of exceeded categories per scenario.
+        """
+        _, limits = self.limits(scenarios)
+        difference = limits - self.actual
+        within = difference >= 0
+        return {
+            "categories": self.categories,
+            "limit": limits,
+            "difference": difference,
+            "within": within,
+            "exceeded": (~within).sum(axis=1)
+        }
+
+    def reports(self, scenarios: list) -> list:
+        """
+        Evaluates scenarios and returns one report per scenario.
+
+        Args:
+            scenarios (list): Scenario dictionaries.
+
+        Returns:
+            list: Reports in the format of `budget.compare_budget_vs_actual`.
+        """
+        result = self.evaluate(scenarios)
+        within_status = "\u2705" f'{lcl.WITHIN_BUDGET}'
+        exceeded_status = "\u26A0" f'{lcl.BUDGET_EXCEEDED}'
+        actual = self.actual.tolist()
+        reports = []
+        for limits, differences, within in zip(result["limit"].tolist(),
+                                                result["difference"].tolist(),
+                                                result["within"].tolist()):
+            reports.append({
+                cat: {
+                    "limit": limit,
+                    "actual": spent,
+                    "difference": diff,
+                    "status": within_status if ok else exceeded_status
+                }
+                for cat, limit, spent, diff, ok in zip(self.categories, limits, actual,
+                                                       differences, within)
+            })
+        return reports
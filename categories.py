@@ -1,4 +1,11 @@
+import hashlib
+import json
+import re
+import sys
+from collections import OrderedDict
 import local as lcl
+from data import Transaction
+from merchants import load_merchants
 
 def all_categories() -> dict:
   """
@@ -92,6 +99,20 @@ def priority_categories() -> list:
   return categories_priority
 
 
+def category_table_hash() -> str:
+    """
+    Returns a hash of the current keyword table, category priorities and merchant
+    dictionary of the default cache.
+
+    Returns:
+        str: Hex digest that changes whenever the categorization rules change.
+    """
+    table = [list(all_categories().items()), priority_categories()]
+    if default_cache.merchants is not None:
+        table.append(default_cache.merchants.digest)
+    return hashlib.sha256(json.dumps(table, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
 def categorize_transaction_with_multiple(description: str, categories: dict,
                                          categories_priority: list) -> str:
     """
@@ -120,18 +141,204 @@ def categorize_transaction_with_multiple(description: str, categories: dict,
     return f'{lcl.OTHER}'
 
 
-def categorize_all_transactions(transactions: list) -> list:
+class Categorizer:
+    """
+    Compiled keyword matcher that resolves a description to its category in one pass.
+
+    All keywords are joined into a single regular expression, ordered by the priority
+    of their categories, and wrapped into a lookahead so that overlapping occurrences
+    are found too. At every position of the text the regex engine picks the
+    highest-priority keyword starting there, so the best category over the whole
+    description is the same one `categorize_transaction_with_multiple` returns.
+
+    Args:
+        categories (dict): A dictionary mapping category names to lists of keywords.
+        categories_priority (list): A list specifying the priority order of categories.
+    """
+
+    def __init__(self, categories: dict, categories_priority: list):
+        ranks = {}
+        keywords = []
+        for rank, category in enumerate(categories_priority):
+            for keyword in categories.get(category, []):
+                if keyword and keyword not in ranks:
+                    ranks[keyword] = rank
+                    keywords.append(keyword)
+        self.categories_priority = list(categories_priority)
+        self._ranks = ranks
+        self._pattern = None
+        if keywords:
+            alternatives = "|".join(re.escape(keyword) for keyword in keywords)
+            self._pattern = re.compile(f"(?=({alternatives}))")
+
+    def categorize(self, description: str) -> str:
+        """
+        Categorizes a single transaction description.
+
+        Args:
+            description (str): The transaction description.
+
+        Returns:
+            str: The name of the highest-priority matched category or 'Other'.
+        """
+        if self._pattern is None:
+            return f'{lcl.OTHER}'
+        best = None
+        for match in self._pattern.finditer(description.lower()):
+            rank = self._ranks[match.group(1)]
+            if best is None or rank < best:
+                best = rank
+                if rank == 0:
+                    break
+        if best is None:
+            return f'{lcl.OTHER}'
+        return self.categories_priority[best]
+
+
+class CategoryCache:
+    """
+    Bounded LRU cache of description -> category results.
+
+    Descriptions are normalized (lowercased and stripped) before lookup, so repeated
+    statement lines such as store names hit the cache regardless of their case.
+    The cache remembers the keyword table it was built for and is cleared as soon
+    as a different table is bound to it.
+
+    With a merchant dictionary (see `merchants.MerchantDictionary`), descriptions
+    are resolved by exact merchant lookup first and by the keyword matcher only when
+    no merchant matches.
+
+    Args:
+        maxsize (int): Maximum number of cached descriptions. Defaults to 100000.
+        merchants (MerchantDictionary, optional): Merchant -> category dictionary.
+    """
+
+    def __init__(self, maxsize: int = 100000, merchants=None):
+        self.maxsize = maxsize
+        self.merchants = merchants
+        self.merchant_file = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._table = None
+        self._categorizer = None
+
+    def use_merchants(self, merchants):
+        """
+        Sets the merchant dictionary consulted before the keywords and clears the cache.
+
+        Args:
+            merchants (MerchantDictionary): The dictionary, or None to use keywords only.
+        """
+        self.merchants = merchants
+        self.merchant_file = None
+        self.clear()
+
+    def use_merchant_file(self, filename: str):
+        """
+        Loads a merchant dictionary file unless it is the one already in use.
+
+        Worker processes are given the path and load the dictionary themselves: a
+        dictionary set in the parent only reaches them when they are forked.
+
+        Args:
+            filename (str): Path to the dictionary, see `merchants.load_merchants`.
+                None keeps the current dictionary.
+        """
+        if filename and filename != self.merchant_file:
+            self.use_merchants(load_merchants(filename))
+            self.merchant_file = filename
+
+    def bind(self, categories: dict, categories_priority: list):
+        """
+        Binds the cache to a keyword table, invalidating it if the table has changed.
+
+        Args:
+            categories (dict): A dictionary mapping category names to lists of keywords.
+            categories_priority (list): A list specifying the priority order of categories.
+        """
+        table = (tuple((cat, tuple(keywords)) for cat, keywords in categories.items()),
+                 tuple(categories_priority))
+        if table != self._table:
+            self._table = table
+            self._categorizer = Categorizer(categories, categories_priority)
+            self.clear()
+
+    def categorize(self, description: str) -> str:
+        """
+        Returns the category of a description, using the cached result if present.
+
+        Args:
+            description (str): The transaction description.
+
+        Returns:
+            str: The name of the matched category or 'Other' if no match found.
+        """
+        if self._categorizer is None:
+            self.bind(all_categories(), priority_categories())
+        key = description.strip().lower()
+        entries = self._entries
+        category = entries.get(key)
+        if category is not None:
+            entries.move_to_end(key)
+            self.hits += 1
+            return category
+        self.misses += 1
+        category = None
+        if self.merchants is not None:
+            category = self.merchants.lookup(key)
+        if category is None:
+            category = self._categorizer.categorize(key)
+        category = entries[key] = sys.intern(category)
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        return category
+
+    def clear(self):
+        """
+        Drops all cached entries and resets the hit/miss counters.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> dict:
+        """
+        Returns cache statistics.
+
+        Returns:
+            dict: Hits, misses, current size and maximum size of the cache.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize
+        }
+
+
+default_cache = CategoryCache()
+
+
+def categorize_all_transactions(transactions: list, cache: CategoryCache = None) -> list:
     """
     Categorizes all transactions in the list based on their descriptions.
 
     Args:
-        transactions (list): List of transaction dictionaries.
+        transactions (list): Transaction records or dictionaries.
+        cache (CategoryCache, optional): Cache to resolve descriptions through.
+            Defaults to the module-level cache shared across runs.
 
     Returns:
         list: The same list, with each transaction augmented with a 'category' key.
     """
+    if cache is None:
+        cache = default_cache
+    cache.bind(all_categories(), priority_categories())
+    categorize = cache.categorize
     for transaction in transactions:
-        desc = transaction.get("description", "")
-        category = categorize_transaction_with_multiple(desc, all_categories(), priority_categories())
-        transaction["category"] = category
+        if transaction.__class__ is Transaction:
+            transaction.category = categorize(transaction.description)
+        else:
+            transaction["category"] = categorize(transaction.get("description", ""))
     return transactions
@@ -1,89 +1,652 @@
 import csv
+import datetime
+import glob
+import io
 import json
 import os.path
+import re
+import sys
+from collections.abc import MutableMapping
+from decimal import Decimal
 import local as lcl
+from money import to_kopecks
 
 
-def read_csv_file(filename: str) -> list:
+_DATE_CACHE = {}
+_DATE_CACHE_LIMIT = 100000
+
+
+def parse_date(value: str):
     """
-    Reads transaction data from a CSV file and returns a list of transactions.
+    Parses a 'YYYY-MM-DD' date string into the fields the analytics functions use.
+
+    Well-formed ISO dates take the fast `date.fromisoformat` path, anything else falls
+    back to `strptime`. Results are memoized per string, since statements repeat the
+    same dates on many rows.
 
     Args:
-        filename (str): Path to the CSV file.
+        value (str): The date string.
 
     Returns:
-        list: A list of dictionaries, each representing a transaction
-        with keys: 'date', 'amount', 'description', 'type'.
-              Returns an empty list if the file is not found.
+        tuple: (ordinal, year, month, quarter), or None if the date is invalid.
     """
-    data = []
+    try:
+        return _DATE_CACHE[value]
+    except KeyError:
+        pass
+    except TypeError:
+        return None
+    try:
+        if len(value) == 10 and value[4] == '-' and value[7] == '-':
+            d = datetime.date.fromisoformat(value)
+        else:
+            d = datetime.datetime.strptime(value, "%Y-%m-%d").date()
+        fields = (d.toordinal(), d.year, d.month, (d.month - 1) // 3 + 1)
+    except (TypeError, ValueError):
+        fields = None
+    if len(_DATE_CACHE) >= _DATE_CACHE_LIMIT:
+        _DATE_CACHE.clear()
+    _DATE_CACHE[value] = fields
+    return fields
+
+
+_INCOME_TYPE = sys.intern(lcl.INCOME_LABEL)
+_EXPENSE_TYPE = sys.intern(lcl.EXPENSE_LABEL)
+
+
+class Transaction(MutableMapping):
+    """
+    Compact transaction record with the fields of the readers' dictionaries.
+
+    The fields live in `__slots__`, so a record takes a fraction of the memory of a
+    dictionary with the same keys. The type labels are two shared strings, and the
+    date, description and category strings are interned, so rows that repeat them
+    share one object.
+
+    The readers return records instead of dictionaries when called with
+    `records=True`. A record is a mutable mapping over its fields: `t["amount"]`,
+    `t.get("category")`, `"category" in t` and `t["category"] = ...` work as with the
+    dictionaries. It is not a `dict` instance, though, so `isinstance(t, dict)` is
+    False and `json.dumps(t)` fails; use `t.to_dict()` to get a dictionary.
+    A field that was never set, like 'category' before categorization, is missing.
+    Keys that are not fields are kept in a dictionary created on first use.
+
+    Args:
+        date (str): The date string as read.
+        amount (float or int): Amount in rubles, or in integer kopecks.
+        description (str): The description.
+    """
+
+    __slots__ = ("date", "amount", "description", "type", "ordinal", "year", "month",
+                 "quarter", "category", "_extra")
+
+    def __init__(self, date: str, amount, description: str):
+        self.date = sys.intern(date)
+        self.amount = amount
+        self.description = sys.intern(description)
+        self.type = _INCOME_TYPE if amount >= 0 else _EXPENSE_TYPE
+        fields = parse_date(date)
+        if fields is None:
+            self.ordinal = self.year = self.month = self.quarter = None
+        else:
+            self.ordinal, self.year, self.month, self.quarter = fields
+        self._extra = None
+
+    def __getitem__(self, key):
+        if key in _FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def get(self, key, default=None):
+        if key in _FIELDS:
+            return getattr(self, key, default)
+        return default if self._extra is None else self._extra.get(key, default)
+
+    def __contains__(self, key) -> bool:
+        if key in _FIELDS:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __setitem__(self, key, value):
+        if key in _FIELDS:
+            if key == "category" and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _FIELDS:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for key in _FIELD_ORDER:
+            if hasattr(self, key):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def copy(self) -> "Transaction":
+        """
+        Returns a shallow copy of the record.
+        """
+        record = Transaction.__new__(Transaction)
+        for key in self.__slots__:
+            if hasattr(self, key):
+                setattr(record, key, getattr(self, key))
+        if self._extra is not None:
+            record._extra = dict(self._extra)
+        return record
+
+    def to_dict(self) -> dict:
+        """
+        Returns the record as a plain dictionary, in the readers' former format.
+        """
+        return dict(self.items())
+
+    def __repr__(self) -> str:
+        return f"Transaction({self.to_dict()!r})"
+
+
+_FIELD_ORDER = Transaction.__slots__[:-1]
+_FIELDS = frozenset(_FIELD_ORDER)
+
+
+def date_fields(transaction: dict):
+    """
+    Returns the parsed date fields of a transaction.
+
+    Uses the fields attached at ingest when present and parses the 'date' otherwise.
+
+    Args:
+        transaction (dict or Transaction): A transaction.
+
+    Returns:
+        tuple: (ordinal, year, month, quarter), or None if the date is invalid.
+    """
+    if transaction.__class__ is Transaction:
+        if transaction.ordinal is None:
+            return None
+        return (transaction.ordinal, transaction.year, transaction.month, transaction.quarter)
+    if "ordinal" in transaction:
+        if transaction["ordinal"] is None:
+            return None
+        return (transaction["ordinal"], transaction["year"],
+                transaction["month"], transaction["quarter"])
+    return parse_date(transaction.get("date"))
+
+
+def to_ordinal(value):
+    """
+    Converts a range boundary to a day ordinal.
+
+    Args:
+        value (str, datetime.date or int): A 'YYYY-MM-DD' string, a date or an ordinal.
+
+    Returns:
+        int: The day ordinal, or None if `value` is None.
+
+    Raises:
+        ValueError: If a string boundary is not a valid date.
+    """
+    if value is None or isinstance(value, int):
+        return value
+    if isinstance(value, datetime.date):
+        return value.toordinal()
+    fields = parse_date(value)
+    if fields is None:
+        raise ValueError(f"invalid date: {value!r}")
+    return fields[0]
+
+
+def select_range(transactions, start=None, end=None):
+    """
+    Returns the transactions dated within [start, end], both ends inclusive.
+
+    Containers with a `between` method (a `time_index.TimeIndex` or a
+    `table.TransactionTable`) answer the query themselves; plain lists are scanned.
+    Rows with an invalid date are never in a range.
+
+    Args:
+        transactions (iterable): Transactions to select from.
+        start (str, datetime.date or int, optional): First day of the range.
+        end (str, datetime.date or int, optional): Last day of the range.
+
+    Returns:
+        iterable: The selected transactions, in their original order.
+    """
+    start, end = to_ordinal(start), to_ordinal(end)
+    between = getattr(transactions, "between", None)
+    if between is not None:
+        return between(start, end)
+    selected = []
+    for t in transactions:
+        fields = date_fields(t)
+        if fields is None:
+            continue
+        if (start is None or fields[0] >= start) and (end is None or fields[0] <= end):
+            selected.append(t)
+    return selected
+
+
+def _transaction_dict(date: str, amount, description: str) -> dict:
+    """
+    Builds a transaction dictionary with the same keys as a `Transaction` record.
+    """
+    transaction = {
+        'date': date,
+        'amount': amount,
+        'description': description,
+        'type': _INCOME_TYPE if amount >= 0 else _EXPENSE_TYPE
+    }
+    transaction['ordinal'], transaction['year'], transaction['month'], \
+        transaction['quarter'] = parse_date(date) or (None, None, None, None)
+    return transaction
+
+
+def iter_csv_file(filename: str, kopecks: bool = False, records: bool = False):
+    """
+    Reads transaction data from a CSV file row by row.
+
+    Args:
+        filename (str): Path to the CSV file.
+        kopecks (bool): Read amounts as exact integer kopecks instead of float rubles.
+        records (bool): Return compact `Transaction` records instead of dictionaries.
+            Defaults to False.
+
+    Yields:
+        dict: A transaction with keys 'date', 'amount', 'description', 'type' and
+        the parsed date fields 'ordinal', 'year', 'month', 'quarter', or a
+        `Transaction` record with the same fields.
+    """
+    invalid_dates = 0
+    parse_amount = to_kopecks if kopecks else float
+    make = Transaction if records else _transaction_dict
     try:
         with open(filename, 'r', encoding='utf-8') as file:
             reader = csv.DictReader(file)
             for row in reader:
-                amount = float(row.get('amount', 0))
-                transaction = {
-                    'date': row.get('date', '').strip(),
-                    'amount': amount,
-                    'description': row.get('description', '').strip(),
-                    'type': f'{lcl.INCOME_LABEL}' if amount >= 0 else f'{lcl.EXPENSE_LABEL}'
-                }
-                data.append(transaction)
+                amount = parse_amount(row.get('amount', 0))
+                transaction = make(row.get('date', '').strip(), amount,
+                                   row.get('description', '').strip())
+                if transaction["ordinal"] is None:
+                    invalid_dates += 1
+                yield transaction
 
     except csv.Error as e:
             print(f' {lcl.FILE_ERROR} {filename}: {e}')
     except Exception as e:
             print(f' {lcl.FILE_EXCEPTION} {filename}: {e}')
-    return data
+    if invalid_dates:
+        print(f' {lcl.INVALID_DATES} {filename}: {invalid_dates}')
+
+
+def csv_byte_ranges(filename: str, chunk_bytes: int = 64 << 20) -> list:
+    """
+    Splits the data part of a CSV file into byte ranges for parallel parsing.
+
+    Range boundaries are arbitrary byte offsets; `iter_csv_range` assigns every line
+    to the range in which it begins, so the ranges cover each row exactly once.
+    Rows are lines here: quoted fields spanning several lines are not supported.
+
+    Args:
+        filename (str): Path to the CSV file.
+        chunk_bytes (int): Approximate size of one range. Defaults to 64 MiB.
+
+    Returns:
+        list: (start, end) byte offsets, the first one starting after the header.
+    """
+    with open(filename, 'rb') as file:
+        file.readline()
+        data_start = file.tell()
+    size = os.path.getsize(filename)
+    if size <= data_start:
+        return []
+    return [(start, min(start + chunk_bytes, size))
+            for start in range(data_start, size, max(chunk_bytes, 1))]
+
+
+def _iter_lines(file, end: int):
+    while file.tell() < end:
+        line = file.readline()
+        if not line:
+            break
+        yield line.decode('utf-8')
+
+
+def iter_csv_range(filename: str, start: int, end: int, kopecks: bool = False,
+                   records: bool = False):
+    """
+    Reads the CSV rows that begin within the byte range [start, end).
+
+    Args:
+        filename (str): Path to the CSV file.
+        start (int): First byte offset of the range.
+        end (int): Byte offset just past the range.
+        kopecks (bool): Read amounts as exact integer kopecks instead of float rubles.
+        records (bool): Return compact `Transaction` records instead of dictionaries.
+            Defaults to False.
+
+    Yields:
+        dict: Transactions in the same format as `iter_csv_file`.
+    """
+    invalid_dates = 0
+    parse_amount = to_kopecks if kopecks else float
+    make = Transaction if records else _transaction_dict
+    try:
+        with open(filename, 'rb') as file:
+            header = next(csv.reader([file.readline().decode('utf-8')]), [])
+            if start > file.tell():
+                file.seek(start - 1)
+                file.readline()
+            reader = csv.DictReader(_iter_lines(file, end), fieldnames=header)
+            for row in reader:
+                amount = parse_amount(row.get('amount', 0))
+                transaction = make(row.get('date', '').strip(), amount,
+                                   row.get('description', '').strip())
+                if transaction["ordinal"] is None:
+                    invalid_dates += 1
+                yield transaction
+
+    except csv.Error as e:
+            print(f' {lcl.FILE_ERROR} {filename}: {e}')
+    except Exception as e:
+            print(f' {lcl.FILE_EXCEPTION} {filename}: {e}')
+    if invalid_dates:
+        print(f' {lcl.INVALID_DATES} {filename}: {invalid_dates}')
+
+
+def normalize_transaction(item: dict, kopecks: bool = False, records: bool = False):
+    """
+    Builds a transaction in the readers' format from a raw record.
+
+    Args:
+        item (dict): A record with 'date', 'amount' and 'description' fields.
+        kopecks (bool): Convert the amount to integer kopecks instead of float rubles.
+        records (bool): Return compact `Transaction` records instead of dictionaries.
+            Defaults to False.
+
+    Returns:
+        dict: A transaction in the same format as `iter_csv_file`.
+    """
+    amount = to_kopecks(item.get('amount', 0)) if kopecks else float(item.get('amount', 0))
+    make = Transaction if records else _transaction_dict
+    return make(str(item.get('date', '')).strip(), amount,
+                str(item.get('description', '')).strip())
 
 
-def read_json_file(filename: str) -> list:
+def read_csv_file(filename: str, kopecks: bool = False, records: bool = False) -> list:
+    """
+    Reads transaction data from a CSV file and returns a list of transactions.
+
+    Args:
+        filename (str): Path to the CSV file.
+        kopecks (bool): Read amounts as exact integer kopecks instead of float rubles.
+        records (bool): Return compact `Transaction` records instead of dictionaries.
+            Defaults to False.
+
+    Returns:
+        list: A list of dictionaries with keys 'date', 'amount', 'description',
+        'type' and the parsed date fields 'ordinal', 'year', 'month', 'quarter',
+        or of `Transaction` records with the same fields.
+              Returns an empty list if the file is not found.
+    """
+    return list(iter_csv_file(filename, kopecks, records))
+
+
+def read_json_file(filename: str, kopecks: bool = False, records: bool = False) -> list:
     """
     Reads a JSON file containing transaction data and returns a list of transactions.
 
     Args:
         filename (str): The path to the JSON file.
+        kopecks (bool): Read amounts as exact integer kopecks; JSON numbers are then
+            decoded as `Decimal` instead of float.
+        records (bool): Return compact `Transaction` records instead of dictionaries.
+            Defaults to False.
 
     Returns:
-        list: A list of dictionaries, each representing a transaction with keys:
-              'date', 'amount', 'description', 'type'.
+        list: A list of dictionaries with keys 'date', 'amount', 'description',
+              'type' and the parsed date fields 'ordinal', 'year', 'month',
+              'quarter', or of `Transaction` records with the same fields.
     """
     data = []
+    invalid_dates = 0
+    parse_amount = to_kopecks if kopecks else float
+    make = Transaction if records else _transaction_dict
     try:
         with open(filename, 'r', encoding='utf-8') as file:
-            json_data = json.load(file)
+            json_data = json.load(file, parse_float=Decimal if kopecks else None)
             for item in json_data.get('transactions', []):
-                amount = float(item.get('amount', 0))
-                data.append({
-                    'date': item.get('date', '').strip(),
-                    'amount': amount,
-                    'description': item.get('description', '').strip(),
-                    'type': f'{lcl.INCOME_LABEL}' if amount >= 0 else f'{lcl.EXPENSE_LABEL}'
-                })
+                amount = parse_amount(item.get('amount', 0))
+                transaction = make(item.get('date', '').strip(), amount,
+                                   item.get('description', '').strip())
+                if transaction["ordinal"] is None:
+                    invalid_dates += 1
+                data.append(transaction)
 
     except json.JSONDecodeError:
         print(f' {lcl.JSON_FORMAT_ERROR} {filename}.')
     except Exception as e:
             print(f' {lcl.FILE_EXCEPTION} {filename}: {e}')
+    if invalid_dates:
+        print(f' {lcl.INVALID_DATES} {filename}: {invalid_dates}')
     return data
 
 
-def import_financial_data(filename: str) -> list:
+_TRANSACTIONS_ARRAY = re.compile(r'"transactions"\s*:\s*\[')
+_JSON_CHUNK_SIZE = 1 << 16
+
+
+def iter_json_file(filename: str, kopecks: bool = False, offset: int = 0,
+                   progress: dict = None, records: bool = False):
     """
-    Imports financial data from a file, supporting CSV and JSON formats.
+    Reads the 'transactions' array of a JSON file incrementally.
+
+    The file is read in fixed-size blocks and array items are decoded one at a time
+    with `json.JSONDecoder.raw_decode`, so memory use does not depend on the file size.
+
+    Args:
+        filename (str): The path to the JSON file.
+        kopecks (bool): Read amounts as exact integer kopecks; JSON numbers are then
+            decoded as `Decimal` instead of float.
+        offset (int): Byte offset just past an item of the array, as reported in
+            `progress` by an earlier read; reading resumes with the next item.
+            Defaults to 0, the start of the file.
+        progress (dict, optional): Filled with 'offset', the byte offset just past
+            the last item read, once reading stops.
+        records (bool): Return compact `Transaction` records instead of dictionaries.
+            Defaults to False.
+
+    Yields:
+        dict: Transactions in the same format as `iter_csv_file`.
+    """
+    decoder = json.JSONDecoder(parse_float=Decimal if kopecks else None)
+    parse_amount = to_kopecks if kopecks else float
+    make = Transaction if records else _transaction_dict
+    invalid_dates = 0
+    base = offset
+    buffer = ''
+    last = 0
+    started = bool(offset)
+    try:
+        with open(filename, 'rb') as raw:
+            raw.seek(offset)
+            file = io.TextIOWrapper(raw, encoding='utf-8')
+            if not offset:
+                while True:
+                    match = _TRANSACTIONS_ARRAY.search(buffer)
+                    if match:
+                        break
+                    block = file.read(_JSON_CHUNK_SIZE)
+                    if not block:
+                        return
+                    kept = buffer[-256:]
+                    base += len(buffer[:len(buffer) - len(kept)].encode('utf-8'))
+                    buffer = kept + block
+                last = match.end()
+                started = True
+            eof = False
+            pos = last
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                    pos += 1
+                if pos < len(buffer) and buffer[pos] == ']':
+                    break
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    block = file.read(_JSON_CHUNK_SIZE)
+                    eof = not block
+                    base += len(buffer[:last].encode('utf-8'))
+                    buffer = buffer[last:] + block
+                    pos -= last
+                    last = 0
+                    continue
+                pos = last = end
+                amount = parse_amount(item.get('amount', 0))
+                transaction = make(item.get('date', '').strip(), amount,
+                                   item.get('description', '').strip())
+                if transaction["ordinal"] is None:
+                    invalid_dates += 1
+                yield transaction
+
+    except json.JSONDecodeError:
+        print(f' {lcl.JSON_FORMAT_ERROR} {filename}.')
+    except Exception as e:
+            print(f' {lcl.FILE_EXCEPTION} {filename}: {e}')
+    finally:
+        if progress is not None:
+            progress["offset"] = base + len(buffer[:last].encode('utf-8')) if started else 0
+    if invalid_dates:
+        print(f' {lcl.INVALID_DATES} {filename}: {invalid_dates}')
+
+
+def iter_financial_data(filename: str, kopecks: bool = False, records: bool = False):
+    """
+    Streams financial data from a CSV or JSON file without loading it whole.
 
     Args:
         filename (str): The path to the data file.
+        kopecks (bool): Read amounts as exact integer kopecks instead of float rubles.
+        records (bool): Return compact `Transaction` records instead of dictionaries.
+            Defaults to False.
+
+    Yields:
+        dict: Transactions in file order. Nothing is yielded if the file is
+        not found or has an unsupported format.
+    """
+    if not os.path.exists(filename):
+        return
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".csv":
+        yield from iter_csv_file(filename, kopecks, records)
+    elif ext == ".json":
+        yield from iter_json_file(filename, kopecks, records=records)
+
+
+def expand_sources(sources) -> list:
+    """
+    Expands file paths, directories and glob patterns into a list of data files.
+
+    Directories contribute their .csv and .json files, patterns are expanded with
+    `glob`. Each source is expanded in sorted order and duplicates are dropped, so
+    the resulting order is deterministic.
+
+    Args:
+        sources (str or list): A path, directory or pattern, or a (nested) list of them.
+
+    Returns:
+        list: Paths of the data files, in processing order.
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    files = []
+    seen = set()
+    for source in sources:
+        if not source:
+            continue
+        if isinstance(source, (list, tuple)):
+            found = expand_sources(source)
+        elif os.path.isdir(source):
+            found = sorted(os.path.join(source, name) for name in os.listdir(source)
+                           if os.path.splitext(name)[1].lower() in (".csv", ".json"))
+        elif glob.has_magic(source):
+            found = sorted(glob.glob(source))
+        else:
+            found = [source]
+        for filename in found:
+            if filename not in seen:
+                seen.add(filename)
+                files.append(filename)
+    return files
+
+
+def iter_chunks(transactions, size: int = 10000):
+    """
+    Groups a stream of transactions into lists of at most `size` items.
+
+    Args:
+        transactions (iterable): Transactions to group.
+        size (int): Maximum chunk length. Defaults to 10000.
+
+    Yields:
+        list: Consecutive chunks of transactions.
+    """
+    chunk = []
+    for transaction in transactions:
+        chunk.append(transaction)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_financial_data(filename, kopecks: bool = False, records: bool = False) -> list:
+    """
+    Imports financial data from a file, supporting CSV and JSON formats.
+
+    Args:
+        filename (str or list): The path to the data file. A directory, a glob
+            pattern or a list of them imports every matching file in order.
+        kopecks (bool): Read amounts as exact integer kopecks instead of float rubles.
+        records (bool): Return compact `Transaction` records instead of dictionaries.
+            Defaults to False.
 
     Returns:
         list: A list of transactions extracted from the file.
         Empty list if file not found or unsupported format.
     """
+    if not isinstance(filename, str) or os.path.isdir(filename) or glob.has_magic(filename):
+        data = []
+        for source in expand_sources(filename):
+            data += import_financial_data(source, kopecks, records)
+        return data
     if not os.path.exists(filename):
         return []
     ext = os.path.splitext(filename)[1].lower()
     if ext == ".csv":
-        return read_csv_file(filename)
+        return read_csv_file(filename, kopecks, records)
     elif ext == ".json":
-        return read_json_file(filename)
+        return read_json_file(filename, kopecks, records)
     return []
@@ -0,0 +1,381 @@
+import argparse
+import os
+import sqlite3
+import local as lcl
+from analytics import Aggregator
+from categories import categorize_all_transactions, category_table_hash
+from data import date_fields, expand_sources, iter_chunks, iter_financial_data, to_ordinal
+from dedup import Deduplicator
+
+SCHEMA_VERSION = 1
+
+# Amount columns are declared without a type: their values keep the storage
+# class they are inserted with, REAL for rubles and INTEGER for kopecks.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    ordinal INTEGER,
+    month TEXT,
+    quarter TEXT,
+    amount NOT NULL,
+    description TEXT NOT NULL,
+    category TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transactions_ordinal ON transactions (ordinal);
+CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category, ordinal);
+
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total_income, total_expense, transaction_count INTEGER,
+    income_transactions INTEGER, expense_transactions INTEGER, invalid_dates INTEGER
+);
+INSERT OR IGNORE INTO totals VALUES (1, 0, 0, 0, 0, 0, 0);
+CREATE TABLE IF NOT EXISTS category_totals (
+    category TEXT PRIMARY KEY, sum, count INTEGER, expenses,
+    first_id INTEGER, first_expense_id INTEGER
+);
+CREATE TABLE IF NOT EXISTS period_totals (
+    kind TEXT, period TEXT, income, expenses, first_id INTEGER,
+    PRIMARY KEY (kind, period)
+);
+CREATE TABLE IF NOT EXISTS period_categories (
+    kind TEXT, period TEXT, category TEXT, count INTEGER, first_id INTEGER,
+    PRIMARY KEY (kind, period, category)
+);
+CREATE TABLE IF NOT EXISTS category_months (
+    category TEXT, month TEXT, spent, first_id INTEGER,
+    PRIMARY KEY (category, month)
+);
+
+CREATE TRIGGER IF NOT EXISTS transactions_aggregate AFTER INSERT ON transactions
+BEGIN
+    UPDATE totals SET
+        total_income = total_income + CASE WHEN NEW.amount > 0 THEN NEW.amount ELSE 0 END,
+        total_expense = total_expense + CASE WHEN NEW.amount < 0 THEN NEW.amount ELSE 0 END,
+        transaction_count = transaction_count + 1,
+        income_transactions = income_transactions + (NEW.amount > 0),
+        expense_transactions = expense_transactions + (NEW.amount < 0),
+        invalid_dates = invalid_dates + (NEW.ordinal IS NULL);
+
+    INSERT INTO category_totals VALUES (
+        NEW.category, NEW.amount, 1, CASE WHEN NEW.amount < 0 THEN -NEW.amount ELSE 0 END,
+        NEW.id, CASE WHEN NEW.amount < 0 THEN NEW.id END)
+    ON CONFLICT (category) DO UPDATE SET
+        sum = sum + excluded.sum,
+        count = count + 1,
+        expenses = expenses + excluded.expenses,
+        first_expense_id = COALESCE(first_expense_id, excluded.first_expense_id);
+
+    INSERT INTO period_totals
+        SELECT 'month', NEW.month, CASE WHEN NEW.amount >= 0 THEN NEW.amount ELSE 0 END,
+               CASE WHEN NEW.amount < 0 THEN NEW.amount ELSE 0 END, NEW.id
+        WHERE NEW.month IS NOT NULL
+        UNION ALL
+        SELECT 'quarter', NEW.quarter, CASE WHEN NEW.amount >= 0 THEN NEW.amount ELSE 0 END,
+               CASE WHEN NEW.amount < 0 THEN NEW.amount ELSE 0 END, NEW.id
+        WHERE NEW.quarter IS NOT NULL
+    ON CONFLICT (kind, period) DO UPDATE SET
+        income = income + excluded.income,
+        expenses = expenses + excluded.expenses;
+
+    INSERT INTO period_categories
+        SELECT 'month', NEW.month, NEW.category, 1, NEW.id
+        WHERE NEW.month IS NOT NULL AND NEW.amount < 0
+        UNION ALL
+        SELECT 'quarter', NEW.quarter, NEW.category, 1, NEW.id
+        WHERE NEW.quarter IS NOT NULL AND NEW.amount < 0
+    ON CONFLICT (kind, period, category) DO UPDATE SET count = count + 1;
+
+    INSERT INTO category_months
+        SELECT NEW.category, NEW.month, -NEW.amount, NEW.id
+        WHERE NEW.month IS NOT NULL AND NEW.amount < 0
+    ON CONFLICT (category, month) DO UPDATE SET spent = spent + excluded.spent;
+END;
+"""
+
+_AGGREGATE_TABLES = ("category_totals", "period_totals", "period_categories", "category_months")
+
+# The same row sets as the materialized tables, grouped over the rows of
+# `ranged` (a common table expression) instead.
+_RANGE_QUERIES = {
+    "totals": """
+        SELECT COALESCE(SUM(CASE WHEN amount > 0 THEN amount END), 0),
+               COALESCE(SUM(CASE WHEN amount < 0 THEN amount END), 0),
+               COUNT(*), COALESCE(SUM(amount > 0), 0), COALESCE(SUM(amount < 0), 0), 0
+        FROM ranged""",
+    "category_totals": """
+        SELECT category, SUM(amount), COUNT(*),
+               COALESCE(SUM(CASE WHEN amount < 0 THEN -amount END), 0),
+               MIN(id), MIN(CASE WHEN amount < 0 THEN id END)
+        FROM ranged GROUP BY category""",
+    "period_totals": """
+        SELECT 'month', month, COALESCE(SUM(CASE WHEN amount >= 0 THEN amount END), 0),
+               COALESCE(SUM(CASE WHEN amount < 0 THEN amount END), 0), MIN(id)
+        FROM ranged GROUP BY month
+        UNION ALL
+        SELECT 'quarter', quarter, COALESCE(SUM(CASE WHEN amount >= 0 THEN amount END), 0),
+               COALESCE(SUM(CASE WHEN amount < 0 THEN amount END), 0), MIN(id)
+        FROM ranged GROUP BY quarter""",
+    "period_categories": """
+        SELECT 'month', month, category, COUNT(*), MIN(id)
+        FROM ranged WHERE amount < 0 GROUP BY month, category
+        UNION ALL
+        SELECT 'quarter', quarter, category, COUNT(*), MIN(id)
+        FROM ranged WHERE amount < 0 GROUP BY quarter, category""",
+    "category_months": """
+        SELECT category, month, SUM(-amount), MIN(id)
+        FROM ranged WHERE amount < 0 GROUP BY category, month"""
+}
+
+
+class TransactionDatabase:
+    """
+    SQLite storage of categorized transactions with trigger-maintained aggregates.
+
+    Rows are inserted in bulk with `executemany` inside one transaction. An
+    AFTER INSERT trigger folds every row into aggregate tables that mirror the
+    fields of `analytics.Aggregator`, so a report over the whole history reads a
+    few rows per category and month instead of the transactions. Every aggregate
+    row remembers the id of its first transaction, which restores the
+    first-appearance ordering of the dictionary-based aggregates. Reports over a
+    date range group the rows found through the date index.
+
+    Categories are stored with the rows. When the category table changes, all rows
+    are recategorized and the aggregates rebuilt on open.
+
+    Args:
+        path (str): Path to the database file, or ':memory:'.
+        kopecks (bool): Store amounts as exact integer kopecks. Fixed when the
+            database is created.
+        create (bool): Create the database if the file does not exist. Readers pass
+            False, so a mistyped path fails instead of reporting on an empty database.
+
+    Raises:
+        FileNotFoundError: If `create` is False and the file does not exist.
+        ValueError: If the database was created with the other amount unit or by a
+            newer schema.
+    """
+
+    def __init__(self, path: str, kopecks: bool = False, create: bool = True):
+        if not create and path != ":memory:" and not os.path.isfile(path):
+            raise FileNotFoundError(f"no such database: {path}")
+        self.path = path
+        self.kopecks = kopecks
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+            meta = dict(self.connection.execute("SELECT key, value FROM meta"))
+            if not meta:
+                meta = {"version": str(SCHEMA_VERSION), "kopecks": str(int(kopecks)),
+                        "categories_hash": category_table_hash()}
+                self.connection.executemany("INSERT INTO meta VALUES (?, ?)", meta.items())
+        if int(meta["version"]) != SCHEMA_VERSION:
+            self.close()
+            raise ValueError(f"unsupported database schema {meta['version']}: {path}")
+        if bool(int(meta["kopecks"])) != kopecks:
+            self.close()
+            unit, flag = ("kopeck", "with") if int(meta["kopecks"]) else ("ruble", "without")
+            raise ValueError(f"database holds {unit} amounts, open it {flag} --kopecks: {path}")
+        if meta["categories_hash"] != category_table_hash():
+            self.recategorize()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT transaction_count FROM totals").fetchone()[0]
+
+    @staticmethod
+    def _row(t: dict) -> tuple:
+        fields = date_fields(t)
+        if fields is None:
+            ordinal = month = quarter = None
+        else:
+            ordinal, year, month_number, quarter_number = fields
+            month = f"{year}-{month_number:02d}"
+            quarter = f"{year}-Q{quarter_number}"
+        return (t.get("date", ""), ordinal, month, quarter, t["amount"],
+                t.get("description", ""), t.get("category", f'{lcl.NO_CATEGORY}'))
+
+    def insert(self, transactions) -> int:
+        """
+        Categorizes and inserts transactions in one database transaction.
+
+        Args:
+            transactions (list): Transactions in the readers' format, with amounts
+                in the database's unit.
+
+        Returns:
+            int: Number of inserted transactions.
+        """
+        transactions = categorize_all_transactions(transactions)
+        with self.connection:
+            self.connection.executemany(
+                "INSERT INTO transactions (date, ordinal, month, quarter, amount, description,"
+                " category) VALUES (?, ?, ?, ?, ?, ?, ?)", map(self._row, transactions))
+        return len(transactions)
+
+    def recategorize(self):
+        """
+        Recategorizes every row with the current category table and rebuilds the aggregates.
+
+        Rows are reinserted with their ids, so the triggers rebuild the aggregate
+        tables in the original order.
+        """
+        rows = self.connection.execute(
+            "SELECT id, date, ordinal, month, quarter, amount, description FROM transactions"
+            " ORDER BY id").fetchall()
+        categories = categorize_all_transactions([{"description": row[6]} for row in rows])
+        with self.connection:
+            self.connection.execute("DELETE FROM transactions")
+            for table in _AGGREGATE_TABLES:
+                self.connection.execute(f"DELETE FROM {table}")
+            self.connection.execute("UPDATE totals SET total_income = 0, total_expense = 0,"
+                                    " transaction_count = 0, income_transactions = 0,"
+                                    " expense_transactions = 0, invalid_dates = 0")
+            self.connection.executemany(
+                "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (row + (t["category"],) for row, t in zip(rows, categories)))
+            self.connection.execute("UPDATE meta SET value = ? WHERE key = 'categories_hash'",
+                                    (category_table_hash(),))
+
+    def _range(self, start, end) -> tuple:
+        start, end = to_ordinal(start), to_ordinal(end)
+        return ("WITH ranged AS (SELECT * FROM transactions WHERE ordinal BETWEEN ? AND ?) ",
+                (1 if start is None else start, 1 << 31 if end is None else end))
+
+    def transactions(self, start=None, end=None):
+        """
+        Reads the stored transactions of a date range through the date index.
+
+        Args:
+            start (str, datetime.date or int, optional): First day of the range.
+            end (str, datetime.date or int, optional): Last day of the range.
+
+        Yields:
+            dict: Categorized transactions in insertion order. Rows with an invalid
+            date are included only when no range is given.
+        """
+        if start is None and end is None:
+            query, params = "SELECT * FROM transactions ORDER BY id", ()
+        else:
+            prefix, params = self._range(start, end)
+            query = prefix + "SELECT * FROM ranged ORDER BY id"
+        income_label = f'{lcl.INCOME_LABEL}'
+        expense_label = f'{lcl.EXPENSE_LABEL}'
+        for _, date, ordinal, _, _, amount, description, category in self.connection.execute(
+                query, params):
+            transaction = {"date": date, "amount": amount, "description": description,
+                           "type": income_label if amount >= 0 else expense_label,
+                           "category": category}
+            fields = date_fields({"date": date}) if ordinal is not None else None
+            transaction["ordinal"], transaction["year"], transaction["month"], \
+                transaction["quarter"] = fields or (None, None, None, None)
+            yield transaction
+
+    def aggregate(self, start=None, end=None, sketch: bool = False) -> Aggregator:
+        """
+        Returns the aggregates of the whole history or of a date range.
+
+        Without a range the aggregate tables are read as they are; with a range the
+        same tables are computed by SQL group-bys over the rows selected through the
+        date index. Sketch-mode aggregates are built from the rows.
+
+        Args:
+            start (str, datetime.date or int, optional): First day of the range.
+            end (str, datetime.date or int, optional): Last day of the range.
+            sketch (bool): Build sketch-mode aggregates. Defaults to False.
+
+        Returns:
+            Aggregator: Aggregates in the same shape and order as
+            `analytics.aggregate_transactions` would build from the rows.
+        """
+        if sketch:
+            aggregate = Aggregator(sketch=True, kopecks=self.kopecks)
+            for chunk in iter_chunks(self.transactions(start, end)):
+                aggregate.update(chunk)
+            return aggregate
+        if start is None and end is None:
+            def fetch(table):
+                columns = "*" if table != "totals" else ("total_income, total_expense, "
+                                                         "transaction_count, income_transactions,"
+                                                         " expense_transactions, invalid_dates")
+                return self.connection.execute(f"SELECT {columns} FROM {table}").fetchall()
+        else:
+            prefix, params = self._range(start, end)
+
+            def fetch(table):
+                return self.connection.execute(prefix + _RANGE_QUERIES[table], params).fetchall()
+        return self._build(fetch)
+
+    def _build(self, fetch) -> Aggregator:
+        aggregate = Aggregator(kopecks=self.kopecks)
+        (aggregate.total_income, aggregate.total_expense, aggregate.transaction_count,
+         aggregate.income_transactions, aggregate.expense_transactions,
+         aggregate.invalid_dates) = fetch("totals")[0]
+        if not aggregate.transaction_count:
+            return aggregate
+        categories = sorted(fetch("category_totals"), key=lambda row: row[4])
+        for cat, total, count, _, _, _ in categories:
+            aggregate.categories[cat] = {"sum": total, "count": count}
+        for cat, _, _, spent, _, _ in sorted(
+                (row for row in categories if row[5] is not None), key=lambda row: row[5]):
+            aggregate.category_expenses[cat] = spent
+        buckets = {"month": aggregate.months, "quarter": aggregate.quarters}
+        for kind, period, income, expenses, _ in sorted(fetch("period_totals"),
+                                                        key=lambda row: row[4]):
+            buckets[kind][period] = {"income": income, "expenses": expenses, "categories": {}}
+        for kind, period, cat, count, _ in sorted(fetch("period_categories"),
+                                                 key=lambda row: row[4]):
+            buckets[kind][period]["categories"][cat] = count
+        for cat, month, spent, _ in sorted(fetch("category_months"), key=lambda row: row[3]):
+            aggregate.category_months.setdefault(cat, {})[month] = spent
+        return aggregate
+
+
+def main(argv=None):
+    """
+    Loads statement files into a transaction database.
+
+    Transactions repeated across the files of one run are merged before insertion
+    unless --no-dedup is given.
+    """
+    parser = argparse.ArgumentParser(description="Load statements into an SQLite database")
+    parser.add_argument("database", help="database file")
+    parser.add_argument("sources", nargs="+", help="statement files, directories or patterns")
+    parser.add_argument("--kopecks", action="store_true",
+                        help="store amounts as exact integer kopecks")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="keep transactions repeated across the input files")
+    parser.add_argument("--dedup-window", type=int, default=0,
+                        help="merge repeats whose dates differ by up to this many days")
+    args = parser.parse_args(argv)
+    count = 0
+    deduplicator = None if args.no_dedup else Deduplicator(args.dedup_window)
+    try:
+        database = TransactionDatabase(args.database, args.kopecks)
+    except ValueError as e:
+        parser.error(str(e))
+    with database:
+        for filename in expand_sources(args.sources):
+            if deduplicator is not None:
+                deduplicator.start_source()
+            for chunk in iter_chunks(iter_financial_data(filename, args.kopecks), 50000):
+                if deduplicator is not None:
+                    chunk = deduplicator.filter(chunk)
+                count += database.insert(chunk)
+    print(f"{count} transactions -> {args.database}")
+
+
+if __name__ == "__main__":
+    main()
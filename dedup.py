@@ -0,0 +1,142 @@
+import hashlib
+from bisect import bisect_left, insort
+from collections import Counter
+from data import date_fields
+
+
+def normalize_description(description: str) -> str:
+    """
+    Lowercases a description and collapses its whitespace.
+
+    Args:
+        description (str): The transaction description.
+
+    Returns:
+        str: The normalized description.
+    """
+    return " ".join(description.lower().split())
+
+
+def fingerprint(transaction: dict) -> int:
+    """
+    Returns a compact 64-bit fingerprint of (date, amount, normalized description).
+
+    The fingerprint is stable across processes, unlike the built-in `hash`.
+
+    Args:
+        transaction (dict): A transaction dictionary.
+
+    Returns:
+        int: The fingerprint.
+    """
+    key = (f"{transaction.get('date', '')}|{round(transaction['amount'] * 100)}|"
+           f"{normalize_description(transaction.get('description', ''))}")
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class Deduplicator:
+    """
+    Drops transactions that repeat rows of previously merged sources.
+
+    Rows are only compared across sources: two identical purchases on the same day in
+    one statement are both kept, while a row that reappears in another source is
+    merged into the first one. Exact duplicates are found through a multiset of
+    64-bit fingerprints. With `window_days` > 0, rows with the same amount and
+    description whose dates differ by at most that many days are merged too, found by
+    binary search in per-(amount, description) sorted date lists; rows with an
+    invalid date are never merged in that mode.
+
+    Sources are processed one after another, so the deduplicator works on streams:
+    call `start_source` before the rows of each source and pass them through `filter`.
+    Its memory is not bounded, though: it keeps one fingerprint (or, with a window,
+    one date) per row kept so far and not yet matched, a few dozen megabytes per
+    million rows. A matched entry is released.
+
+    Args:
+        window_days (int): Date tolerance for near-duplicates. Defaults to 0 (exact).
+    """
+
+    def __init__(self, window_days: int = 0):
+        self.window_days = window_days
+        self.merged = 0
+        self._seen = Counter()
+        self._current = Counter()
+        self._dates = {}
+        self._current_dates = []
+
+    def start_source(self):
+        """
+        Marks the end of the previous source; its rows become candidates for merging.
+        """
+        self._seen.update(self._current)
+        self._current.clear()
+        for key, ordinal in self._current_dates:
+            insort(self._dates.setdefault(key, []), ordinal)
+        self._current_dates.clear()
+
+    def _merge_near(self, transaction: dict) -> bool:
+        fields = date_fields(transaction)
+        if fields is None:
+            return False
+        key = (round(transaction['amount'] * 100),
+               normalize_description(transaction.get('description', '')))
+        ordinal = fields[0]
+        dates = self._dates.get(key)
+        if dates:
+            i = bisect_left(dates, ordinal - self.window_days)
+            if i < len(dates) and dates[i] <= ordinal + self.window_days:
+                del dates[i]
+                if not dates:
+                    del self._dates[key]
+                return True
+        self._current_dates.append((key, ordinal))
+        return False
+
+    def filter(self, transactions) -> list:
+        """
+        Returns the transactions of the current source that are not duplicates.
+
+        Args:
+            transactions (iterable): Rows of the current source.
+
+        Returns:
+            list: The rows to keep, in their original order.
+        """
+        kept = []
+        for t in transactions:
+            if self.window_days:
+                if self._merge_near(t):
+                    self.merged += 1
+                    continue
+            else:
+                fp = fingerprint(t)
+                count = self._seen[fp]
+                if count:
+                    if count == 1:
+                        del self._seen[fp]
+                    else:
+                        self._seen[fp] = count - 1
+                    self.merged += 1
+                    continue
+                self._current[fp] += 1
+            kept.append(t)
+        return kept
+
+
+def deduplicate_transactions(sources: list, window_days: int = 0) -> tuple:
+    """
+    Concatenates the transactions of several sources, merging cross-source duplicates.
+
+    Args:
+        sources (list): One list of transactions per source, in merge order.
+        window_days (int): Date tolerance for near-duplicates. Defaults to 0 (exact).
+
+    Returns:
+        tuple: The merged transaction list and the number of rows merged away.
+    """
+    deduplicator = Deduplicator(window_days)
+    transactions = []
+    for source in sources:
+        deduplicator.start_source()
+        transactions += deduplicator.filter(source)
+    return transactions, deduplicator.merged
@@ -162,17 +162,20 @@ CLEANING = '''клининг'''
 FILE_ERROR = '''Ошибка формата в файле'''
 FILE_EXCEPTION = '''Ошибка чтения файла'''
 JSON_FORMAT_ERROR = '''Ошибка формата JSON в'''
+INVALID_DATES = '''Строк с некорректной датой в'''
 OTHER = '''другое'''
 NO_CATEGORY = '''Без категории'''
 SAVINGS = '''накопления'''
 WITHIN_BUDGET = '''В пределах бюджета'''
 BUDGET_EXCEEDED = '''Превышен бюджет'''
+BUDGET_THRESHOLD_REACHED = '''Достигнут порог бюджета'''
 NO_VISUALIZATION_DATA = '''Нет данных для визуализации.'''
 EXPENSES_BY_CATEGORY = '''Расходы по категориям'''
 CATEGORY = '''Категория'''
 AMOUNT_RUB = '''Сумма, руб.'''
 SMART_PIGGY_BANK = '''УМНАЯ КОПИЛКА — личный финансовый помощник'''
 NO_ANALYSIS_DATA = '''Нет данных для анализа.'''
+DUPLICATES_MERGED = '''Объединено дубликатов:'''
 FINANCIAL_REPORT = '''ФИНАНСОВЫЙ ОТЧЁТ'''
 INCOME = '''Доходы:'''
 EXPENSES = '''Расходы:'''
@@ -188,6 +191,9 @@ AVERAGE_RUB = '''руб. в среднем'''
 BUDGET_COMPARISON = '''СРАВНЕНИЕ С БЮДЖЕТОМ:'''
 SPENT = '''потрачено'''
 LIMIT = '''лимит'''
+SPENDING_DISTRIBUTION = '''РАСПРЕДЕЛЕНИЕ РАСХОДОВ:'''
+MEDIAN = '''медиана'''
+PERCENTILE_90 = '''90-й процентиль'''
 ANALYSIS_SUCCESS = '''Анализ завершён успешно!'''
 
 CSV_INPUT = '''Введите имя CSV файла (или Enter для пропуска):'''
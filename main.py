@@ -1,21 +1,236 @@
+import argparse
+import os.path
 import local as lcl
-from data import import_financial_data
-from analytics import (calculate_basic_stats, calculate_by_category, analyze_by_time,
-                       analyze_historical_spending)
+from data import (expand_sources, import_financial_data, iter_chunks, iter_financial_data,
+                  select_range)
+from analytics import (Aggregator, aggregate_transactions, calculate_basic_stats,
+                       calculate_by_category, analyze_by_time, analyze_historical_spending,
+                       analyze_spending_distribution)
 from budget import create_budget_template, compare_budget_vs_actual
 from vizualization import visualize_financial_data
-from categories import (all_categories, priority_categories,
+from categories import (all_categories, priority_categories, default_cache,
                         categorize_transaction_with_multiple, categorize_all_transactions)
+from parallel import aggregate_files
+from state import update_state
+from report import FORMATS, SECTIONS, discover_accounts, run_batch
+from dedup import Deduplicator
+from instrumentation import NULL_TRACER, Tracer
 
 
-def smart_piggy_bank(csv_file=None, json_file=None):
+def _count_cache(stage, hits: int, misses: int):
+    hits, misses = default_cache.hits - hits, default_cache.misses - misses
+    stage.count(cache_hits=hits, cache_misses=misses,
+                cache_hit_rate=round(hits / (hits + misses), 4) if hits + misses else None)
+
+
+class UsageError(ValueError):
+    """
+    An option combination or input that the selected ingest mode cannot handle.
+    """
+
+
+_DEDUP_CONFLICT = ("--workers, --cache-dir and --state aggregate every file independently "
+                   "and cannot merge duplicates across files; pass --no-dedup")
+
+
+def load_aggregate(sources, stream=False, chunk_size=10000, workers=None, cache_dir=None,
+                   state_file=None, start=None, end=None, deduplicator=None,
+                   tracer=None, sketch=False, kopecks=False, store_dir=None,
+                   store_accounts=None, database=None, merchants=None) -> tuple:
+    """
+    Reads, categorizes and aggregates the statement files with the selected ingest mode.
+
+    Args:
+        sources (list): Paths, directories or glob patterns of the statement files.
+        stream (bool): Process the files chunk by chunk in bounded memory.
+        chunk_size (int): Number of transactions per chunk in streaming mode.
+        workers (int, optional): Number of worker processes.
+        cache_dir (str, optional): Directory of the binary columnar cache.
+        state_file (str, optional): Path of the incremental state.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to report on.
+        end (str, optional): Last day of the period to report on. The in-memory mode
+            parses every row anyway and selects the period in the same linear pass;
+            a `time_index.TimeIndex` only pays off when it is kept for repeated
+            queries, as in `service`.
+        deduplicator (Deduplicator, optional): Merges rows repeated across files.
+            Used by the in-memory and streaming modes. The worker, cache and state
+            modes aggregate every file independently and refuse a deduplicator when
+            there is more than one file; a store or database is deduplicated when
+            it is ingested.
+        tracer (Tracer, optional): Records the time and memory of every stage.
+        sketch (bool): Build sketch-mode aggregates with bounded memory per bucket.
+        kopecks (bool): Read and sum amounts as exact integer kopecks.
+        store_dir (str, optional): Directory of a partitioned store to read instead
+            of the statement files. Only the partitions of the period are opened.
+        store_accounts (list, optional): Accounts of the store to include.
+        database (str, optional): Path of an SQLite transaction database to read
+            instead of the statement files.
+        merchants (str, optional): Path of the merchant dictionary the worker
+            processes load.
+
+    Returns:
+        tuple: The categorized transaction list (None unless it was loaded into
+        memory) and the Aggregator of the transactions within the period.
+
+    Raises:
+        UsageError: If a period is combined with an incremental state, a
+            deduplicator with the worker, cache or state mode over several files,
+            or the database is missing or holds the other amount unit.
+    """
+    tracer = tracer or NULL_TRACER
+    ranged = start is not None or end is not None
+    if (deduplicator is not None and (workers or cache_dir or state_file)
+            and not (database or store_dir) and len(expand_sources(sources)) > 1):
+        raise UsageError(_DEDUP_CONFLICT)
+    if database:
+        from database import TransactionDatabase
+        with tracer.stage("database") as stage:
+            try:
+                db = TransactionDatabase(database, kopecks, create=False)
+            except (FileNotFoundError, ValueError) as e:
+                raise UsageError(str(e)) from e
+            with db:
+                aggregate = db.aggregate(start, end, sketch)
+            stage.count(aggregate.transaction_count, invalid_dates=aggregate.invalid_dates)
+        return None, aggregate
+    if store_dir:
+        from partitions import PartitionStore
+        with tracer.stage("store") as stage:
+            partitions = {}
+            aggregate = PartitionStore(store_dir, kopecks).aggregate(start, end, store_accounts,
+                                                                     sketch, partitions)
+            stage.count(aggregate.transaction_count, invalid_dates=aggregate.invalid_dates,
+                        partitions=partitions["partitions"],
+                        partitions_from_manifest=partitions["from_manifest"],
+                        partitions_read=partitions["read"])
+        return None, aggregate
+    if state_file:
+        if ranged:
+            raise UsageError("a report period cannot be combined with an incremental state")
+        with tracer.stage("state") as stage:
+            aggregate = update_state(sources, state_file, sketch, kopecks)
+            stage.count(aggregate.transaction_count, invalid_dates=aggregate.invalid_dates)
+        return None, aggregate
+    if workers:
+        with tracer.stage("workers") as stage:
+            aggregate = aggregate_files(sources, workers,
+                                        date_range=(start, end) if ranged else None,
+                                        sketch=sketch, kopecks=kopecks, merchants=merchants)
+            stage.count(aggregate.transaction_count, invalid_dates=aggregate.invalid_dates)
+        return None, aggregate
+    if cache_dir:
+        from table_cache import load_table
+        with tracer.stage("cache") as stage:
+            aggregate = Aggregator(sketch, kopecks=kopecks)
+            for filename in expand_sources(sources):
+                if os.path.exists(filename):
+                    table = load_table(filename, cache_dir, kopecks)
+                    if ranged:
+                        table = table.between(start, end)
+                    aggregate.merge(table.aggregate(sketch=sketch))
+            stage.count(aggregate.transaction_count, invalid_dates=aggregate.invalid_dates)
+        return None, aggregate
+    if stream:
+        with tracer.stage("stream") as stage:
+            hits, misses = default_cache.hits, default_cache.misses
+            aggregate = Aggregator(sketch, kopecks=kopecks)
+            read = 0
+            for filename in expand_sources(sources):
+                if deduplicator is not None:
+                    deduplicator.start_source()
+                for chunk in iter_chunks(iter_financial_data(filename, kopecks), chunk_size):
+                    read += len(chunk)
+                    if deduplicator is not None:
+                        chunk = deduplicator.filter(chunk)
+                    if ranged:
+                        chunk = select_range(chunk, start, end)
+                    aggregate.update(categorize_all_transactions(chunk))
+            merged = deduplicator.merged if deduplicator is not None else 0
+            stage.count(aggregate.transaction_count, rows_read=read, duplicates_merged=merged,
+                        skipped=read - merged - aggregate.transaction_count,
+                        invalid_dates=aggregate.invalid_dates)
+            _count_cache(stage, hits, misses)
+        return None, aggregate
+    with tracer.stage("parse") as stage:
+        transactions = []
+        for filename in expand_sources(sources):
+            if deduplicator is not None:
+                deduplicator.start_source()
+                transactions += deduplicator.filter(
+                    import_financial_data(filename, kopecks, records=True))
+            else:
+                transactions += import_financial_data(filename, kopecks, records=True)
+        stage.count(len(transactions))
+        if deduplicator is not None:
+            stage.count(duplicates_merged=deduplicator.merged)
+    if ranged:
+        with tracer.stage("select_range") as stage:
+            read = len(transactions)
+            transactions = select_range(transactions, start, end)
+            stage.count(len(transactions), skipped=read - len(transactions))
+    with tracer.stage("categorize") as stage:
+        hits, misses = default_cache.hits, default_cache.misses
+        transactions = categorize_all_transactions(transactions)
+        stage.count(len(transactions))
+        _count_cache(stage, hits, misses)
+    with tracer.stage("aggregate") as stage:
+        aggregate = aggregate_transactions(transactions, sketch, kopecks)
+        stage.count(aggregate.transaction_count, invalid_dates=aggregate.invalid_dates)
+    return transactions, aggregate
+
+
+def smart_piggy_bank(csv_file=None, json_file=None, stream=False, chunk_size=10000,
+                     workers=None, cache_dir=None, state_file=None, plot=True,
+                     plot_file=None, start=None, end=None, dedup=True, window_days=0,
+                     tracer=None, sketch=False, kopecks=False, store_dir=None,
+                     store_accounts=None, database=None, merchants=None):
     """
     Main function to perform comprehensive financial analysis and visualization.
 
     Args:
-        csv_file (str): Path to CSV data file.
-        json_file (str): Path to JSON data file.
+        csv_file (str or list): Path to CSV data file. A directory, a glob pattern
+            or a list of them is accepted as well.
+        json_file (str or list): Path to JSON data file, or a directory, pattern or list.
+        stream (bool): Read, categorize and aggregate the files chunk by chunk
+            instead of loading every transaction into memory. Defaults to False.
+            Memory stays bounded only without deduplication, which keeps one
+            fingerprint per row.
+        chunk_size (int): Number of transactions per chunk in streaming mode.
+        workers (int, optional): Parse and categorize the files in this many
+            worker processes, merging partial aggregates.
+        cache_dir (str, optional): Directory of the binary columnar cache. Unchanged
+            files are loaded from it instead of being parsed again.
+        state_file (str, optional): Path of the incremental state. Only rows appended
+            since the previous run are parsed and folded into the saved aggregates.
+        plot (bool): Draw the expenses chart. Defaults to True.
+        plot_file (str, optional): Save the chart to a PNG or SVG file without
+            opening a window.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to report on.
+        end (str, optional): Last day of the period to report on.
+        dedup (bool): Merge transactions repeated across the input files. Defaults to True.
+            A store or database is deduplicated when it is ingested instead.
+        window_days (int): Also merge repeats whose dates differ by up to this many days.
+        tracer (Tracer, optional): Records wall time, CPU time, rows and peak memory
+            of every stage. Instrumentation is off when omitted.
+        sketch (bool): Aggregate with bounded-memory sketches and add the median and
+            90th percentile of the expenses per category to the report.
+        kopecks (bool): Parse and sum amounts as exact integer kopecks instead of
+            float rubles. Budget limits are then computed in kopecks as well.
+        store_dir (str, optional): Report on a partitioned store (see `partitions`)
+            instead of the statement files.
+        store_accounts (list, optional): Accounts of the store to report on.
+            Defaults to all.
+        database (str, optional): Report on an SQLite transaction database (see
+            `database`) instead of the statement files.
+        merchants (str, optional): Path to a merchant dictionary resolved before the
+            keyword rules, in this process and in every worker process.
+
+    Raises:
+        UsageError: If the options cannot be combined or do not match the
+            database, see `load_aggregate`.
     """
+    tracer = tracer or NULL_TRACER
+    default_cache.use_merchant_file(merchants)
     print("=" * 70)
     print("\U0001F4B0" f'{lcl.SMART_PIGGY_BANK}' "\U0001F4A1")
     print("=" * 70)
@@ -25,55 +240,198 @@ def smart_piggy_bank(csv_file=None, json_file=None):
     if json_file is None:
         json_file = input(f'{lcl.JSON_INPUT}')
 
-    transactions = []
-    if csv_file:
-        transactions += import_financial_data(csv_file)
-    if json_file:
-        transactions += import_financial_data(json_file)
-
-    if not transactions:
+    deduplicator = Deduplicator(window_days) if dedup else None
+    transactions, aggregate = load_aggregate([csv_file, json_file], stream, chunk_size,
+                                             workers, cache_dir, state_file, start, end,
+                                             deduplicator, tracer, sketch, kopecks,
+                                             store_dir, store_accounts, database, merchants)
+    if deduplicator is not None and deduplicator.merged:
+        print(f'{lcl.DUPLICATES_MERGED} {deduplicator.merged}')
+    if not aggregate.transaction_count:
         print("\u274C" f'{lcl.NO_ANALYSIS_DATA}')
         return
 
-    transactions = categorize_all_transactions(transactions)
+    rows = aggregate.transaction_count
+    with tracer.stage("calculate_basic_stats") as stage:
+        stats = calculate_basic_stats(transactions, aggregate)
+        stage.count(rows)
+    with tracer.stage("calculate_by_category") as stage:
+        categories_stats = calculate_by_category(transactions, aggregate)
+        stage.count(rows)
+    with tracer.stage("analyze_by_time") as stage:
+        timeline = analyze_by_time(transactions, aggregate)
+        stage.count(rows)
+    with tracer.stage("analyze_historical_spending") as stage:
+        analysis = analyze_historical_spending(transactions, aggregate)
+        stage.count(rows)
+    with tracer.stage("budget") as stage:
+        budget = create_budget_template(analysis, stats["total_income"], kopecks)
+        comparison = compare_budget_vs_actual(budget, transactions, aggregate)
+        stage.count(rows)
+
+    with tracer.stage("print_report"):
+        print("\n===" f'{lcl.FINANCIAL_REPORT}' "===")
+        print(f'\U0001F4B0 {lcl.INCOME} {stats["total_income"]:.2f}')
+        print(f'\U0001F4B8 {lcl.EXPENSES} {abs(stats["total_expense"]):.2f}')
+        print(f'\u2696 {lcl.BALANCE}{stats["balance"]:.2f}')
 
-    stats = calculate_basic_stats(transactions)
-    categories_stats = calculate_by_category(transactions)
-    timeline = analyze_by_time(transactions)
-    analysis = analyze_historical_spending(transactions)
-    budget = create_budget_template(analysis, stats["total_income"])
-    comparison = compare_budget_vs_actual(budget, transactions)
+        print("\n\U0001F4CA" f'{lcl.EXPENSES_BY_CATEGORY_TITLE}')
+        for cat, data in categories_stats.items():
+            print(f"  {cat}: {abs(data['sum']):.2f} {lcl.RUB} ({data['percent']:.1f}%)")
 
+        print("\n\U0001F4C5" f'{lcl.MONTHLY_ANALYSIS}')
+        for month, data in timeline.items():
+            top = ", ".join([f"{c} ({n})" for c, n in data["top_categories"]])
+            print(f"  {month}: {lcl.INCOME_LABEL} {data['income']:.2f} | {lcl.EXPENSE_LABEL}"
+                  f" {abs(data['expenses']):.2f} → {lcl.TOP} {top}")
 
-    print("\n===" f'{lcl.FINANCIAL_REPORT}' "===")
-    print(f'\U0001F4B0 {lcl.INCOME} {stats['total_income']:.2f}')
-    print(f'\U0001F4B8 {lcl.EXPENSES} {abs(stats['total_expense']):.2f}')
-    print(f'\u2696 {lcl.BALANCE}{stats['balance']:.2f}')
+        print("\n\U0001F3AF" f'{lcl.RECOMMENDATIONS}')
+        for cat, val in analysis["top_categories"]:
+            print(f"  {cat}: {val:.2f} {lcl.AVERAGE_RUB}")
 
-    print("\n\U0001F4CA" f'{lcl.EXPENSES_BY_CATEGORY_TITLE}')
-    for cat, data in categories_stats.items():
-        print(f"  {cat}: {abs(data['sum']):.2f} {lcl.RUB} ({data['percent']:.1f}%)")
+        print("\n\U0001F4CB" f'{lcl.BUDGET_COMPARISON}')
+        for cat, info in comparison.items():
+            print(f"  {cat}: {lcl.SPENT} {info['actual']:.2f} / {lcl.LIMIT} "
+                  f"{info['limit']:.2f} → {info['status']}")
 
-    print("\n\U0001F4C5" f'{lcl.MONTHLY_ANALYSIS}')
-    for month, data in timeline.items():
-        top = ", ".join([f"{c} ({n})" for c, n in data["top_categories"]])
-        print(f"  {month}: {lcl.INCOME_LABEL} {data['income']:.2f} | {lcl.EXPENSE_LABEL}"
-              f" {abs(data['expenses']):.2f} → {lcl.TOP} {top}")
+        if sketch:
+            print("\n\U0001F4C8" f'{lcl.SPENDING_DISTRIBUTION}')
+            distribution = analyze_spending_distribution(transactions, aggregate,
+                                                         quantiles=(0.5, 0.9))
+            for cat, info in distribution.items():
+                print(f"  {cat}: {lcl.MEDIAN} {info['quantiles'][0.5]:.2f} | "
+                      f"{lcl.PERCENTILE_90} {info['quantiles'][0.9]:.2f} {lcl.RUB}")
 
-    print("\n\U0001F3AF" f'{lcl.RECOMMENDATIONS}')
-    for cat, val in analysis["top_categories"]:
-        print(f"  {cat}: {val:.2f} {lcl.AVERAGE_RUB}")
+        print("\n\u2705" f'{lcl.ANALYSIS_SUCCESS}' "\n")
 
-    print("\n\U0001F4CB" f'{lcl.BUDGET_COMPARISON}')
-    for cat, info in comparison.items():
-        print(f"  {cat}: {lcl.SPENT} {info['actual']:.2f} / {lcl.LIMIT} "
-              f"{info['limit']:.2f} → {info['status']}")
+    if plot:
+        with tracer.stage("plot") as stage:
+            visualize_financial_data(transactions, aggregate, output=plot_file)
+            stage.count(rows)
 
-    print("\n\u2705" f'{lcl.ANALYSIS_SUCCESS}' "\n")
 
-    visualize_financial_data(transactions)
+def main(argv=None):
+    """
+    Command-line entry point. Asks for the files interactively when none are given.
+
+    With --output-dir the run is non-interactive: one machine-readable report is
+    written per account, where the accounts are the subdirectories of --accounts
+    or, without it, the files given by --csv/--json. The period, sketch, kopeck,
+    worker, merchant and deduplication options apply to every account; the store,
+    database, cache, state, streaming, trace and plot options are rejected.
+
+    Args:
+        argv (list, optional): Command-line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description=f'{lcl.SMART_PIGGY_BANK}')
+    parser.add_argument("--csv", nargs="+", help="CSV files, directories or glob patterns")
+    parser.add_argument("--json", nargs="+", help="JSON files, directories or glob patterns")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of worker processes for parsing and categorization")
+    parser.add_argument("--stream", action="store_true",
+                        help="process the files chunk by chunk in bounded memory "
+                             "(deduplication still keeps a fingerprint per row; "
+                             "add --no-dedup for a strict bound)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="directory of the parsed statement cache")
+    parser.add_argument("--state", default=None,
+                        help="state file for incremental processing of appended rows")
+    parser.add_argument("--store", default=None,
+                        help="report on a partitioned store instead of the statement files")
+    parser.add_argument("--account", nargs="+", default=None,
+                        help="accounts of the store to report on (default: all)")
+    parser.add_argument("--db", default=None,
+                        help="report on an SQLite transaction database instead of the "
+                             "statement files")
+    parser.add_argument("--plot-file", default=None,
+                        help="save the chart to a PNG or SVG file instead of showing it")
+    parser.add_argument("--no-plot", action="store_true", help="skip the chart")
+    parser.add_argument("--start", default=None, help="first day of the report (YYYY-MM-DD)")
+    parser.add_argument("--end", default=None, help="last day of the report (YYYY-MM-DD)")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="keep transactions repeated across input files")
+    parser.add_argument("--dedup-window", type=int, default=0,
+                        help="merge repeats whose dates differ by up to this many days")
+    parser.add_argument("--accounts", default=None,
+                        help="directory with one subdirectory of statements per account")
+    parser.add_argument("--output-dir", default=None,
+                        help="write machine-readable reports to this directory")
+    parser.add_argument("--format", choices=FORMATS, default="json",
+                        help="report format in batch mode")
+    parser.add_argument("--sections", nargs="+", choices=list(SECTIONS), default=None,
+                        help="report sections in batch mode (default: all)")
+    parser.add_argument("--merchants", default=None,
+                        help="merchant dictionary (binary, or CSV with merchant and "
+                             "category columns) resolved before the keyword rules")
+    parser.add_argument("--sketch", action="store_true",
+                        help="aggregate with bounded-memory sketches and report "
+                             "expense medians and percentiles")
+    parser.add_argument("--kopecks", action="store_true",
+                        help="parse and sum amounts as exact integer kopecks")
+    parser.add_argument("--trace", nargs="?", const="-", default=None, metavar="FILE",
+                        help="time every stage; write a JSON trace to FILE or, without "
+                             "FILE, print a summary table to stderr")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also record peak memory per stage with tracemalloc")
+    args = parser.parse_args(argv)
+    if args.state and (args.start or args.end):
+        parser.error("--start/--end cannot be combined with --state")
+    if args.sections and "distribution" in args.sections and not args.sketch:
+        parser.error("the distribution section needs --sketch")
+    default_cache.use_merchant_file(args.merchants)
+    if args.accounts or args.output_dir:
+        ignored = [flag for flag, value in (("--store", args.store), ("--account", args.account),
+                                            ("--db", args.db), ("--cache-dir", args.cache_dir),
+                                            ("--state", args.state), ("--stream", args.stream),
+                                            ("--trace", args.trace),
+                                            ("--trace-memory", args.trace_memory),
+                                            ("--plot-file", args.plot_file)) if value]
+        if ignored:
+            parser.error(f"{', '.join(ignored)} cannot be combined with "
+                         f"--accounts/--output-dir")
+        if args.accounts:
+            accounts = discover_accounts(args.accounts)
+        else:
+            accounts = {"report": [args.csv or "", args.json or ""]}
+        for path in run_batch(accounts, args.output_dir or "reports", args.format,
+                              args.sections, args.workers, args.start, args.end, args.sketch,
+                              args.kopecks, not args.no_dedup, args.dedup_window,
+                              args.merchants):
+            if path:
+                print(path)
+        return
+    if args.store or args.db:
+        if args.no_dedup or args.dedup_window:
+            parser.error("--no-dedup/--dedup-window apply when ingesting into a store "
+                         "or database, see partitions.py and database.py")
+    elif (not args.no_dedup and (args.workers or args.cache_dir or args.state)
+          and len(expand_sources([args.csv or "", args.json or ""])) > 1):
+        parser.error(_DEDUP_CONFLICT)
+    csv_file = args.csv
+    json_file = args.json
+    if csv_file or json_file or args.store or args.db:
+        csv_file = csv_file or ""
+        json_file = json_file or ""
+    tracer = Tracer(memory=args.trace_memory) if args.trace or args.trace_memory else None
+    try:
+        smart_piggy_bank(csv_file, json_file, stream=args.stream, workers=args.workers,
+                         cache_dir=args.cache_dir, state_file=args.state,
+                         plot=not args.no_plot, plot_file=args.plot_file,
+                         start=args.start, end=args.end, dedup=not args.no_dedup,
+                         window_days=args.dedup_window, tracer=tracer, sketch=args.sketch,
+                         kopecks=args.kopecks, store_dir=args.store,
+                         store_accounts=args.account, database=args.db,
+                         merchants=args.merchants)
+    except UsageError as e:
+        parser.error(str(e))
+    if tracer is not None:
+        tracer.close()
+        if args.trace and args.trace != "-":
+            tracer.write_json(args.trace)
+        else:
+            tracer.print_summary()
 
 
 if __name__ == "__main__":
-    smart_piggy_bank()
+    main()
     
@@ -0,0 +1,185 @@
+import argparse
+import csv
+import hashlib
+import pickle
+import re
+
+MERCHANTS_FORMAT = 2
+# Binary layout: the magic bytes, then a pickle (protocol 4, readable by every
+# Python 3.4+) of (MERCHANTS_FORMAT, max_tokens, categories, index), where
+# `categories` is a list of category names and `index` maps space-joined merchant
+# tokens to positions in that list.
+_MAGIC = b"SPB-MERCHANTS\n"
+_PICKLE_PROTOCOL = 4
+_SEPARATORS = re.compile(r"[\W_]+")
+
+
+def tokenize(text: str) -> list:
+    """
+    Splits a description or merchant name into normalized tokens.
+
+    Text is lowercased, 'ё' is folded into 'е' and everything that is not a letter
+    or a digit separates tokens, so "Пятёрочка №123, Москва" and "ПЯТЕРОЧКА 123
+    МОСКВА" give the same tokens.
+
+    Args:
+        text (str): The text to tokenize.
+
+    Returns:
+        list: The tokens, in order.
+    """
+    return [token for token in _SEPARATORS.split(text.lower().replace('ё', 'е')) if token]
+
+
+class MerchantDictionary:
+    """
+    Exact-match merchant -> category dictionary with hash lookups on description tokens.
+
+    Every merchant name is stored as its space-joined tokens. A description is
+    resolved by looking up its token n-grams, longest first and leftmost first, so
+    the cost is a handful of dictionary lookups per description however many
+    merchants the dictionary holds.
+
+    Args:
+        entries (dict): Merchant names mapped to category names.
+    """
+
+    def __init__(self, entries: dict = None):
+        self.categories = []
+        self.index = {}
+        self.max_tokens = 0
+        self.digest = None
+        category_ids = {}
+        for merchant, category in (entries or {}).items():
+            tokens = tokenize(merchant)
+            if not tokens:
+                continue
+            code = category_ids.get(category)
+            if code is None:
+                code = category_ids[category] = len(self.categories)
+                self.categories.append(category)
+            self.index[" ".join(tokens)] = code
+            self.max_tokens = max(self.max_tokens, len(tokens))
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def lookup(self, description: str) -> str:
+        """
+        Returns the category of the merchant named in a description.
+
+        Args:
+            description (str): The transaction description.
+
+        Returns:
+            str: The category of the longest matching merchant, or None.
+        """
+        tokens = tokenize(description)
+        index = self.index
+        for size in range(min(self.max_tokens, len(tokens)), 0, -1):
+            for start in range(len(tokens) - size + 1):
+                code = index.get(" ".join(tokens[start:start + size]))
+                if code is not None:
+                    return self.categories[code]
+        return None
+
+    @classmethod
+    def from_csv(cls, filename: str) -> "MerchantDictionary":
+        """
+        Reads a merchant dictionary from a CSV file with 'merchant' and 'category' columns.
+
+        Args:
+            filename (str): Path to the CSV file.
+
+        Returns:
+            MerchantDictionary: The dictionary.
+        """
+        with open(filename, 'r', encoding='utf-8') as file:
+            entries = {row['merchant']: row['category'].strip()
+                       for row in csv.DictReader(file) if row.get('merchant')}
+        return cls(entries)
+
+    def to_bytes(self) -> bytes:
+        """
+        Returns the dictionary in the compact binary format read by `load`.
+        """
+        return _MAGIC + pickle.dumps((MERCHANTS_FORMAT, self.max_tokens, self.categories,
+                                      self.index), protocol=_PICKLE_PROTOCOL)
+
+    def save(self, filename: str):
+        """
+        Writes the dictionary in the compact binary format read by `load`.
+
+        Args:
+            filename (str): Path of the output file.
+        """
+        with open(filename, 'wb') as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, filename: str) -> "MerchantDictionary":
+        """
+        Reads a dictionary saved with `save`.
+
+        The index is stored already tokenized, so loading is a single unpickle. Only
+        load dictionaries from trusted sources, as with any pickle.
+
+        Args:
+            filename (str): Path to the binary file.
+
+        Returns:
+            MerchantDictionary: The dictionary.
+
+        Raises:
+            ValueError: If the file is not a merchant dictionary of a known format.
+        """
+        with open(filename, 'rb') as file:
+            content = file.read()
+        if not content.startswith(_MAGIC):
+            raise ValueError(f"not a merchant dictionary: {filename}")
+        try:
+            version, max_tokens, categories, index = pickle.loads(content[len(_MAGIC):])
+        except (pickle.UnpicklingError, EOFError, TypeError, ValueError):
+            raise ValueError(f"not a merchant dictionary: {filename}")
+        if version != MERCHANTS_FORMAT:
+            raise ValueError(f"unsupported merchant dictionary format {version}: {filename}")
+        merchants = cls()
+        merchants.max_tokens = max_tokens
+        merchants.categories = categories
+        merchants.index = index
+        merchants.digest = hashlib.sha256(content).hexdigest()
+        return merchants
+
+
+def load_merchants(filename: str) -> MerchantDictionary:
+    """
+    Loads a merchant dictionary from a binary file or, for a .csv path, from text.
+
+    Args:
+        filename (str): Path to the dictionary.
+
+    Returns:
+        MerchantDictionary: The dictionary, with `digest` identifying its contents.
+    """
+    if filename.lower().endswith(".csv"):
+        merchants = MerchantDictionary.from_csv(filename)
+        merchants.digest = hashlib.sha256(merchants.to_bytes()).hexdigest()
+        return merchants
+    return MerchantDictionary.load(filename)
+
+
+def main(argv=None):
+    """
+    Converts a merchant CSV file into the binary dictionary format.
+    """
+    parser = argparse.ArgumentParser(description="Build a binary merchant dictionary")
+    parser.add_argument("source", help="CSV file with 'merchant' and 'category' columns")
+    parser.add_argument("output", help="output binary file")
+    args = parser.parse_args(argv)
+    merchants = MerchantDictionary.from_csv(args.source)
+    merchants.save(args.output)
+    print(f"{len(merchants)} merchants -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+_DIGITS = frozenset("0123456789")
+
+
+def parse_kopecks(text: str) -> int:
+    """
+    Parses a decimal amount of rubles into integer kopecks without going through float.
+
+    Both '.' and ',' are accepted as the decimal separator. Digits past the second
+    decimal place are rounded half away from zero; exponent notation is accepted
+    through `decimal.Decimal`.
+
+    Args:
+        text (str): The amount, e.g. '-1234.56'.
+
+    Returns:
+        int: The amount in kopecks.
+
+    Raises:
+        ValueError: If the text is not a number.
+    """
+    text = text.strip()
+    negative = text[:1] == '-'
+    unsigned = text[1:] if text[:1] in '+-' and text else text
+    whole, _, fraction = unsigned.replace(',', '.').partition('.')
+    if ((whole or fraction) and _DIGITS.issuperset(whole) and _DIGITS.issuperset(fraction)):
+        kopecks = int(whole or '0') * 100 + int(fraction[:2].ljust(2, '0'))
+        if fraction[2:3] >= '5':
+            kopecks += 1
+        return -kopecks if negative else kopecks
+    try:
+        value = Decimal(text.replace(',', '.'))
+    except InvalidOperation:
+        raise ValueError(f"invalid amount: {text!r}")
+    if not value.is_finite():
+        raise ValueError(f"invalid amount: {text!r}")
+    return int((value * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def to_kopecks(value) -> int:
+    """
+    Converts an amount of rubles of any supported type into integer kopecks.
+
+    Floats are converted through their shortest decimal representation, so 0.1
+    becomes 10 kopecks rather than the binary value's expansion.
+
+    Args:
+        value (int, float, str or Decimal): The amount in rubles.
+
+    Returns:
+        int: The amount in kopecks.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"invalid amount: {value!r}")
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, Decimal):
+        return int((value * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    if isinstance(value, float):
+        return parse_kopecks(repr(value))
+    return parse_kopecks(str(value))
+
+
+def divide_kopecks(numerator: int, denominator: int) -> int:
+    """
+    Divides integers and rounds the quotient half away from zero.
+
+    Args:
+        numerator (int): The dividend, e.g. an amount in kopecks times a percentage.
+        denominator (int): The positive divisor.
+
+    Returns:
+        int: The rounded quotient.
+    """
+    quotient = (2 * abs(numerator) + denominator) // (2 * denominator)
+    return -quotient if numerator < 0 else quotient
+
+
+def to_rubles(kopecks: int) -> float:
+    """
+    Converts kopecks to the float nearest to the exact amount of rubles.
+    """
+    return kopecks / 100
+
+
+def format_kopecks(kopecks: int) -> str:
+    """
+    Formats kopecks as an exact decimal amount of rubles, e.g. -123456 -> '-1234.56'.
+    """
+    sign = '-' if kopecks < 0 else ''
+    rubles, rest = divmod(abs(kopecks), 100)
+    return f"{sign}{rubles}.{rest:02d}"
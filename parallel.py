@@ -0,0 +1,130 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from analytics import Aggregator
+from categories import categorize_all_transactions, default_cache
+from data import (csv_byte_ranges, expand_sources, iter_chunks, iter_csv_range,
+                  iter_financial_data, select_range)
+
+
+def plan_tasks(sources, chunk_bytes: int = 64 << 20) -> list:
+    """
+    Splits data sources into independent parsing tasks.
+
+    CSV files are cut into byte ranges at line boundaries, JSON files are parsed
+    as a whole. The task list only depends on the files and `chunk_bytes`, never on
+    the number of workers, so the merged result is the same for any worker count.
+
+    Args:
+        sources (str or list): Paths, directories or glob patterns.
+        chunk_bytes (int): Approximate size of one CSV range. Defaults to 64 MiB.
+
+    Returns:
+        list: (filename, start, end) tuples; start and end are None for whole files.
+    """
+    tasks = []
+    for filename in expand_sources(sources):
+        if os.path.splitext(filename)[1].lower() == ".csv" and os.path.exists(filename):
+            for start, end in csv_byte_ranges(filename, chunk_bytes):
+                tasks.append((filename, start, end))
+        else:
+            tasks.append((filename, None, None))
+    return tasks
+
+
+def init_worker(merchants: str = None):
+    """
+    Prepares a worker process: loads the merchant dictionary into its category cache.
+
+    Args:
+        merchants (str, optional): Path to the merchant dictionary.
+    """
+    default_cache.use_merchant_file(merchants)
+
+
+def aggregate_task(task: tuple, sketch: bool = False, kopecks: bool = False,
+                   deduplicator=None, merchants: str = None) -> Aggregator:
+    """
+    Parses, categorizes and aggregates one task produced by `plan_tasks`.
+
+    Args:
+        task (tuple): (filename, start, end) of the data to process, optionally
+            followed by the first and last day of the dates to keep.
+        sketch (bool): Build sketch-mode aggregates. Defaults to False.
+        kopecks (bool): Read amounts as exact integer kopecks. Defaults to False.
+        deduplicator (Deduplicator, optional): Drops rows that repeat rows of the
+            files processed before. The caller marks the start of every file.
+        merchants (str, optional): Path to the merchant dictionary to categorize with.
+
+    Returns:
+        Aggregator: Partial aggregates of the task's transactions.
+    """
+    init_worker(merchants)
+    filename, start, end = task[:3]
+    first_day, last_day = task[3:] or (None, None)
+    if start is None:
+        transactions = iter_financial_data(filename, kopecks)
+    else:
+        transactions = iter_csv_range(filename, start, end, kopecks)
+    aggregate = Aggregator(sketch, kopecks=kopecks)
+    for chunk in iter_chunks(transactions):
+        if deduplicator is not None:
+            chunk = deduplicator.filter(chunk)
+        if first_day is not None or last_day is not None:
+            chunk = select_range(chunk, first_day, last_day)
+        aggregate.update(categorize_all_transactions(chunk))
+    return aggregate
+
+
+def aggregate_files(sources, workers: int = None, chunk_bytes: int = 64 << 20,
+                    date_range: tuple = None, sketch: bool = False,
+                    kopecks: bool = False, deduplicator=None,
+                    merchants: str = None) -> Aggregator:
+    """
+    Aggregates many statement files, optionally across a pool of worker processes.
+
+    Partial aggregates are merged in the parent in task order, which keeps the
+    output deterministic regardless of which worker finishes first.
+
+    Merging duplicates needs the files in order, so with a `deduplicator` the tasks
+    are processed in the current process whatever the number of workers.
+
+    Args:
+        sources (str or list): Paths, directories or glob patterns.
+        workers (int, optional): Number of worker processes. None or 1 processes
+            the tasks in the current process.
+        chunk_bytes (int): Approximate size of one CSV range. Defaults to 64 MiB.
+        date_range (tuple, optional): (start, end) days; only transactions dated
+            within them are aggregated.
+        sketch (bool): Build sketch-mode aggregates. Defaults to False.
+        kopecks (bool): Read amounts as exact integer kopecks. Defaults to False.
+        deduplicator (Deduplicator, optional): Merges rows repeated across files.
+        merchants (str, optional): Path to the merchant dictionary. Worker processes
+            load it in their initializer, whatever the multiprocessing start method.
+
+    Returns:
+        Aggregator: Aggregates of all transactions.
+    """
+    tasks = plan_tasks(sources, chunk_bytes)
+    if date_range:
+        tasks = [task + tuple(date_range) for task in tasks]
+    task_function = partial(aggregate_task, sketch=sketch, kopecks=kopecks,
+                            merchants=merchants)
+    result = Aggregator(sketch, kopecks=kopecks)
+    if deduplicator is not None:
+        filename = None
+        for task in tasks:
+            if task[0] != filename:
+                filename = task[0]
+                deduplicator.start_source()
+            result.merge(task_function(task, deduplicator=deduplicator))
+        return result
+    if not workers or workers <= 1 or len(tasks) <= 1:
+        for part in map(task_function, tasks):
+            result.merge(part)
+        return result
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(merchants,)) as executor:
+        for part in executor.map(task_function, tasks):
+            result.merge(part)
+    return result
@@ -0,0 +1,330 @@
+import argparse
+import csv
+import datetime
+import json
+import os
+from analytics import Aggregator
+from categories import categorize_all_transactions, category_table_hash
+from data import date_fields, expand_sources, iter_chunks, iter_csv_range, select_range, \
+    to_ordinal
+from dedup import Deduplicator
+from money import format_kopecks
+from state import iter_appended, resume_offset
+
+MANIFEST_VERSION = 1
+UNDATED = "undated"
+_FIELDS = ("date", "amount", "description")
+
+
+def _format_amount(amount, kopecks: bool) -> str:
+    return format_kopecks(amount) if kopecks else repr(float(amount))
+
+
+def _check_account(account: str):
+    if not account or account.startswith(".") or os.sep in account or "/" in account:
+        raise ValueError(f"invalid account name: {account!r}")
+
+
+class PartitionStore:
+    """
+    On-disk transaction store partitioned by account and month.
+
+    Every partition is a CSV file `<root>/<account>/<YYYY-MM>.csv`; rows with an
+    invalid date go to an `undated` partition. A manifest keeps, per partition, the
+    first and last day, the row and byte counts and the partition's aggregates. A
+    query opens only the partitions that overlap its date range, and a partition
+    that lies entirely within the range is answered from the manifest without
+    reading its rows.
+
+    The manifest also records, per account, how far every statement file has been
+    ingested, so `ingest_source` adds only the rows appended since the previous run.
+    Partition files are read up to the size recorded in the manifest, so the rows of
+    an interrupted ingest stay invisible until they are overwritten.
+
+    The aggregates depend on the category table and on the amount unit, so a change
+    of either marks them stale; stale partitions are re-aggregated from their rows
+    the next time a query needs them.
+
+    Args:
+        root (str): Directory of the store. Created on the first ingest.
+        kopecks (bool): Read and aggregate amounts as exact integer kopecks.
+    """
+
+    def __init__(self, root: str, kopecks: bool = False):
+        self.root = root
+        self.kopecks = kopecks
+        self.manifest_file = os.path.join(root, "manifest.json")
+        self.partitions = {}
+        self.sources = {}
+        manifest = None
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            pass
+        if manifest and manifest.get("version") == MANIFEST_VERSION:
+            self.partitions = manifest["partitions"]
+            self.sources = manifest.get("sources", {})
+            if (manifest.get("categories_hash") != category_table_hash()
+                    or manifest.get("kopecks", False) != kopecks):
+                for info in self.partitions.values():
+                    info["aggregate"] = None
+
+    def save(self):
+        """
+        Writes the manifest atomically.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        staging = self.manifest_file + ".tmp"
+        with open(staging, 'w', encoding='utf-8') as file:
+            json.dump({"version": MANIFEST_VERSION, "categories_hash": category_table_hash(),
+                       "kopecks": self.kopecks, "partitions": self.partitions,
+                       "sources": self.sources},
+                      file, ensure_ascii=False)
+        os.replace(staging, self.manifest_file)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key + ".csv")
+
+    def ingest(self, account: str, transactions, save: bool = True) -> int:
+        """
+        Appends transactions to the partitions of an account and updates the manifest.
+
+        Rows past the size recorded in the manifest, left by an interrupted ingest,
+        are dropped before appending.
+
+        Args:
+            account (str): Account name, used as a directory name.
+            transactions (iterable): Transactions in the readers' format.
+            save (bool): Write the manifest afterwards. Callers ingesting many chunks
+                pass False and call `save` once at the end.
+
+        Returns:
+            int: Number of ingested transactions.
+        """
+        _check_account(account)
+        groups = {}
+        for t in transactions:
+            fields = date_fields(t)
+            month = UNDATED if fields is None else f"{fields[1]}-{fields[2]:02d}"
+            groups.setdefault(f"{account}/{month}", []).append(t)
+        os.makedirs(os.path.join(self.root, account), exist_ok=True)
+        for key, rows in groups.items():
+            info = self.partitions.get(key)
+            if info is None:
+                info = self.partitions[key] = {
+                    "account": account, "month": key.rsplit("/", 1)[1], "min_date": None,
+                    "max_date": None, "rows": 0, "size": 0,
+                    "aggregate": Aggregator(kopecks=self.kopecks).to_dict()}
+            path = self._path(key)
+            if os.path.exists(path) and os.path.getsize(path) > info["size"]:
+                os.truncate(path, info["size"])
+            with open(path, 'a', encoding='utf-8', newline='') as file:
+                writer = csv.writer(file)
+                if not info["size"]:
+                    writer.writerow(_FIELDS)
+                for t in rows:
+                    writer.writerow([t["date"], _format_amount(t["amount"], self.kopecks),
+                                     t["description"]])
+            info["size"] = os.path.getsize(path)
+            info["rows"] += len(rows)
+            ordinals = [fields[0] for fields in map(date_fields, rows) if fields is not None]
+            if ordinals:
+                first = datetime.date.fromordinal(min(ordinals)).isoformat()
+                last = datetime.date.fromordinal(max(ordinals)).isoformat()
+                info["min_date"] = min(info["min_date"] or first, first)
+                info["max_date"] = max(info["max_date"] or last, last)
+            if info["aggregate"] is not None:
+                aggregate = Aggregator.from_dict(info["aggregate"])
+                aggregate.update(categorize_all_transactions(rows))
+                info["aggregate"] = aggregate.to_dict()
+        if save:
+            self.save()
+        return sum(len(rows) for rows in groups.values())
+
+    def ingest_source(self, account: str, filename: str, deduplicator=None,
+                      chunk_size: int = 10000) -> int:
+        """
+        Ingests the rows of a statement file appended since it was last ingested.
+
+        The position reached is recorded in the manifest, which is not written here:
+        call `save` after the last source. A file whose ingested part has changed is
+        ingested again from the start; the store cannot tell which of its rows were
+        replaced, so the rows ingested before are kept.
+
+        Args:
+            account (str): Account name, used as a directory name.
+            filename (str): Path to a CSV or JSON statement.
+            deduplicator (Deduplicator, optional): Filters the rows before ingest.
+                The caller calls `start_source` before each file.
+            chunk_size (int): Number of transactions per ingested chunk.
+
+        Returns:
+            int: Number of ingested transactions.
+        """
+        _check_account(account)
+        if not os.path.exists(filename):
+            return 0
+        sources = self.sources.setdefault(account, {})
+        path = os.path.abspath(filename)
+        offset = resume_offset(filename, sources.get(path, {}))
+        progress = {}
+        count = 0
+        for chunk in iter_chunks(iter_appended(filename, offset, self.kopecks, progress),
+                                 chunk_size):
+            if deduplicator is not None:
+                chunk = deduplicator.filter(chunk)
+            count += self.ingest(account, chunk, save=False)
+        if progress:
+            sources[path] = progress
+        return count
+
+    def select(self, start=None, end=None, accounts=None) -> list:
+        """
+        Returns the keys of the partitions that may hold rows of a query, in order.
+
+        Partitions are ordered by account and month. The undated partitions only
+        match queries without a date range.
+
+        Args:
+            start (str, datetime.date or int, optional): First day of the range.
+            end (str, datetime.date or int, optional): Last day of the range.
+            accounts (list, optional): Account names to include. Defaults to all.
+
+        Returns:
+            list: Partition keys ('<account>/<YYYY-MM>' or '<account>/undated').
+        """
+        start, end = to_ordinal(start), to_ordinal(end)
+        ranged = start is not None or end is not None
+        keys = []
+        for key, info in self.partitions.items():
+            if accounts is not None and info["account"] not in accounts:
+                continue
+            if info["min_date"] is None:
+                if ranged:
+                    continue
+            elif ((start is not None and to_ordinal(info["max_date"]) < start)
+                  or (end is not None and to_ordinal(info["min_date"]) > end)):
+                continue
+            keys.append(key)
+        return sorted(keys, key=lambda key: (self.partitions[key]["account"],
+                                             self.partitions[key]["month"] == UNDATED,
+                                             self.partitions[key]["month"]))
+
+    def _covered(self, info: dict, start, end) -> bool:
+        if info["min_date"] is None:
+            return start is None and end is None
+        return ((start is None or to_ordinal(info["min_date"]) >= start)
+                and (end is None or to_ordinal(info["max_date"]) <= end))
+
+    def iter_partition(self, key: str):
+        """
+        Reads the rows of one partition, up to the size recorded in the manifest.
+
+        Yields:
+            dict: Transactions in the readers' format, in ingest order.
+        """
+        yield from iter_csv_range(self._path(key), 0, self.partitions[key]["size"],
+                                  self.kopecks)
+
+    def transactions(self, start=None, end=None, accounts=None):
+        """
+        Reads the transactions of a date range, opening only the partitions it overlaps.
+
+        Args:
+            start (str, datetime.date or int, optional): First day of the range.
+            end (str, datetime.date or int, optional): Last day of the range.
+            accounts (list, optional): Account names to include. Defaults to all.
+
+        Yields:
+            dict: Uncategorized transactions, partition by partition.
+        """
+        first, last = to_ordinal(start), to_ordinal(end)
+        for key in self.select(first, last, accounts):
+            if self._covered(self.partitions[key], first, last):
+                yield from self.iter_partition(key)
+            else:
+                yield from select_range(list(self.iter_partition(key)), first, last)
+
+    def aggregate(self, start=None, end=None, accounts=None, sketch: bool = False,
+                  stats: dict = None) -> Aggregator:
+        """
+        Aggregates the transactions of a date range.
+
+        Partitions entirely within the range contribute their manifest aggregates;
+        only the partitions cut by a range boundary, or whose aggregates are stale,
+        are read and aggregated row by row. Sketch-mode aggregates are not kept in
+        the manifest, so `sketch=True` reads every selected partition.
+
+        Args:
+            start (str, datetime.date or int, optional): First day of the range.
+            end (str, datetime.date or int, optional): Last day of the range.
+            accounts (list, optional): Account names to include. Defaults to all.
+            sketch (bool): Build sketch-mode aggregates. Defaults to False.
+            stats (dict, optional): Filled with the numbers of partitions in the
+                store, answered from the manifest and read.
+
+        Returns:
+            Aggregator: Aggregates of the transactions, merged in partition order.
+        """
+        first, last = to_ordinal(start), to_ordinal(end)
+        result = Aggregator(sketch, kopecks=self.kopecks)
+        from_manifest = read = 0
+        refreshed = False
+        for key in self.select(first, last, accounts):
+            info = self.partitions[key]
+            covered = self._covered(info, first, last)
+            if covered and not sketch and info["aggregate"] is not None:
+                result.merge(Aggregator.from_dict(info["aggregate"]))
+                from_manifest += 1
+                continue
+            read += 1
+            aggregate = Aggregator(sketch, kopecks=self.kopecks)
+            for chunk in iter_chunks(self.iter_partition(key)):
+                if not covered:
+                    chunk = select_range(chunk, first, last)
+                aggregate.update(categorize_all_transactions(chunk))
+            if covered and not sketch:
+                info["aggregate"] = aggregate.to_dict()
+                refreshed = True
+            result.merge(aggregate)
+        if refreshed:
+            self.save()
+        if stats is not None:
+            stats.update(partitions=len(self.partitions), from_manifest=from_manifest,
+                         read=read)
+        return result
+
+
+def main(argv=None):
+    """
+    Ingests statement files into a partitioned store.
+
+    Files ingested before contribute only the rows appended to them since.
+    Transactions repeated across the files of one run are merged before ingest
+    unless --no-dedup is given; rows ingested by earlier runs are not compared.
+    """
+    parser = argparse.ArgumentParser(description="Ingest statements into a partitioned store")
+    parser.add_argument("root", help="store directory")
+    parser.add_argument("account", help="account name")
+    parser.add_argument("sources", nargs="+", help="statement files, directories or patterns")
+    parser.add_argument("--kopecks", action="store_true",
+                        help="aggregate amounts as exact integer kopecks")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="keep transactions repeated across the input files")
+    parser.add_argument("--dedup-window", type=int, default=0,
+                        help="merge repeats whose dates differ by up to this many days")
+    args = parser.parse_args(argv)
+    store = PartitionStore(args.root, args.kopecks)
+    count = 0
+    deduplicator = None if args.no_dedup else Deduplicator(args.dedup_window)
+    for filename in expand_sources(args.sources):
+        if deduplicator is not None:
+            deduplicator.start_source()
+        count += store.ingest_source(args.account, filename, deduplicator)
+    store.save()
+    print(f"{count} transactions -> {args.root}")
+
+
+if __name__ == "__main__":
+    main()
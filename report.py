@@ -0,0 +1,222 @@
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from analytics import (Aggregator, calculate_basic_stats, calculate_by_category, analyze_by_time,
+                       analyze_seasonal_trends, analyze_historical_spending,
+                       analyze_spending_distribution)
+from budget import create_budget_template, compare_budget_vs_actual
+from dedup import Deduplicator
+from parallel import aggregate_files, init_worker
+
+FORMATS = ("json", "csv", "columnar")
+
+
+def _top(pairs: list) -> str:
+    return ", ".join(f"{cat} ({count})" for cat, count in pairs)
+
+
+def _stats_rows(aggregate: Aggregator) -> list:
+    stats = calculate_basic_stats(None, aggregate)
+    return [{"metric": name, "value": value} for name, value in stats.items()]
+
+
+def _category_rows(aggregate: Aggregator) -> list:
+    return [{"category": cat, "sum": val["sum"], "count": val["count"], "percent": val["percent"]}
+            for cat, val in calculate_by_category(None, aggregate).items()]
+
+
+def _period_rows(periods: dict, column: str) -> list:
+    return [{column: key, "income": val["income"], "expenses": val["expenses"],
+             "top_categories": _top(val["top_categories"])}
+            for key, val in periods.items()]
+
+
+def _month_rows(aggregate: Aggregator) -> list:
+    return _period_rows(analyze_by_time(None, aggregate), "month")
+
+
+def _quarter_rows(aggregate: Aggregator) -> list:
+    return _period_rows(analyze_seasonal_trends(None, aggregate), "quarter")
+
+
+def _recommendation_rows(aggregate: Aggregator) -> list:
+    analysis = analyze_historical_spending(None, aggregate)
+    return [{"category": cat, "average": val} for cat, val in analysis["average_spending"].items()]
+
+
+def _budget_rows(aggregate: Aggregator) -> list:
+    analysis = analyze_historical_spending(None, aggregate)
+    budget = create_budget_template(analysis, aggregate.money(aggregate.total_income),
+                                    aggregate.kopecks)
+    return [{"category": cat, "limit": info["limit"], "actual": info["actual"],
+             "difference": info["difference"], "status": info["status"]}
+            for cat, info in compare_budget_vs_actual(budget, None, aggregate).items()]
+
+
+def _distribution_rows(aggregate: Aggregator) -> list:
+    distribution = analyze_spending_distribution(None, aggregate, quantiles=(0.5, 0.9, 0.99))
+    return [{"category": cat, "count": info["count"], "mean": info["mean"],
+             "stdev": info["stdev"], "min": info["min"], "max": info["max"],
+             "p50": info["quantiles"][0.5], "p90": info["quantiles"][0.9],
+             "p99": info["quantiles"][0.99]}
+            for cat, info in distribution.items()]
+
+
+SECTIONS = {
+    "stats": _stats_rows,
+    "categories": _category_rows,
+    "months": _month_rows,
+    "quarters": _quarter_rows,
+    "recommendations": _recommendation_rows,
+    "budget": _budget_rows,
+    "distribution": _distribution_rows
+}
+
+
+def build_report(aggregate: Aggregator, sections=None) -> dict:
+    """
+    Builds a machine-readable report from aggregated transactions.
+
+    Every section is a table: a list of rows with the same columns. The
+    'distribution' section needs sketch-mode aggregates.
+
+    Args:
+        aggregate (Aggregator): Aggregates of an account's transactions.
+        sections (list, optional): Names of the sections to include, see `SECTIONS`.
+            Defaults to all sections, 'distribution' only for sketch-mode aggregates.
+
+    Returns:
+        dict: Section names mapped to lists of row dictionaries.
+    """
+    if not sections:
+        sections = [name for name in SECTIONS if name != "distribution" or aggregate.sketch]
+    return {name: SECTIONS[name](aggregate) for name in sections}
+
+
+def write_json(report: dict, path: str):
+    """
+    Writes a report as one JSON object of section tables.
+    """
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+def write_csv(report: dict, path: str):
+    """
+    Writes a report as a long-format CSV with section, key, field and value columns.
+    """
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["section", "key", "field", "value"])
+        for section, rows in report.items():
+            for row in rows:
+                columns = iter(row.items())
+                _, key = next(columns)
+                for field, value in columns:
+                    writer.writerow([section, key, field, value])
+
+
+def write_columnar(report: dict, path: str):
+    """
+    Writes a report as a NumPy .npz archive with one array per section column.
+
+    Arrays are named '<section>.<column>'; numeric columns are stored as float64.
+    """
+    import numpy as np
+    arrays = {}
+    for section, rows in report.items():
+        for column in (rows[0] if rows else {}):
+            values = [row[column] for row in rows]
+            if all(isinstance(v, (int, float)) for v in values):
+                arrays[f"{section}.{column}"] = np.asarray(values, dtype=np.float64)
+            else:
+                arrays[f"{section}.{column}"] = np.asarray([str(v) for v in values])
+    np.savez(path, **arrays)
+
+
+WRITERS = {
+    "json": (write_json, ".json"),
+    "csv": (write_csv, ".csv"),
+    "columnar": (write_columnar, ".npz")
+}
+
+
+def discover_accounts(root: str) -> dict:
+    """
+    Treats every subdirectory of `root` as one account's statement set.
+
+    Args:
+        root (str): Directory with one subdirectory per account.
+
+    Returns:
+        dict: Account names mapped to their directories, sorted by name.
+    """
+    return {name: os.path.join(root, name) for name in sorted(os.listdir(root))
+            if os.path.isdir(os.path.join(root, name))}
+
+
+def report_account(job: tuple) -> str:
+    """
+    Aggregates one account and writes its report.
+
+    The compiled categorizer and its cache live at module level, so every account
+    processed by the same process reuses them.
+
+    Args:
+        job (tuple): (name, sources, output_dir, fmt, sections, start, end, sketch,
+            kopecks, dedup, window_days, merchants), see `run_batch`.
+
+    Returns:
+        str: Path of the written report, or None if the account has no transactions.
+    """
+    name, sources, output_dir, fmt, sections, start, end, sketch, kopecks, dedup, \
+        window_days, merchants = job
+    ranged = start is not None or end is not None
+    aggregate = aggregate_files(sources, date_range=(start, end) if ranged else None,
+                                sketch=sketch, kopecks=kopecks,
+                                deduplicator=Deduplicator(window_days) if dedup else None,
+                                merchants=merchants)
+    if not aggregate.transaction_count:
+        return None
+    writer, extension = WRITERS[fmt]
+    path = os.path.join(output_dir, name + extension)
+    writer(build_report(aggregate, sections), path)
+    return path
+
+
+def run_batch(accounts: dict, output_dir: str, fmt: str = "json", sections=None,
+              workers: int = None, start=None, end=None, sketch: bool = False,
+              kopecks: bool = False, dedup: bool = True, window_days: int = 0,
+              merchants: str = None) -> list:
+    """
+    Writes one report per account, optionally spreading accounts over worker processes.
+
+    Args:
+        accounts (dict): Account names mapped to their statement sources.
+        output_dir (str): Directory for the reports.
+        fmt (str): Output format, one of `FORMATS`. Defaults to 'json'.
+        sections (list, optional): Report sections to include. Defaults to all.
+        workers (int, optional): Number of worker processes. None or 1 runs in-process.
+        start (str, optional): First day ('YYYY-MM-DD') of the period to report on.
+        end (str, optional): Last day of the period to report on.
+        sketch (bool): Aggregate with bounded-memory sketches. Defaults to False.
+        kopecks (bool): Read and sum amounts as exact integer kopecks. Defaults to False.
+        dedup (bool): Merge transactions repeated across the files of an account.
+            Defaults to True.
+        window_days (int): Also merge repeats whose dates differ by up to this many days.
+        merchants (str, optional): Path to the merchant dictionary, loaded by every
+            worker process.
+
+    Returns:
+        list: Paths of the written reports in account order, None for empty accounts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = [(name, sources, output_dir, fmt, sections, start, end, sketch, kopecks, dedup,
+             window_days, merchants) for name, sources in accounts.items()]
+    if not workers or workers <= 1 or len(jobs) <= 1:
+        return [report_account(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(merchants,)) as executor:
+        return list(executor.map(report_account, jobs,
+                                 chunksize=max(len(jobs) // (workers * 4), 1)))
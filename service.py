@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import json
+from urllib.parse import parse_qs, urlsplit
+from analytics import (Aggregator, aggregate_transactions, calculate_basic_stats,
+                       calculate_by_category, analyze_by_time, analyze_seasonal_trends,
+                       analyze_historical_spending)
+from budget import create_budget_template, compare_budget_vs_actual
+from categories import categorize_all_transactions, default_cache
+from data import expand_sources, import_financial_data, normalize_transaction
+from dedup import Deduplicator
+from time_index import TimeIndex
+
+
+class TransactionStore:
+    """
+    In-memory transaction store with running aggregates and materialized query results.
+
+    Transactions are kept in arrival order in a `TimeIndex` that lives as long as
+    the store. New rows are folded into the running Aggregator, and query results
+    over all transactions are computed once and reused until the next ingest.
+    Queries over a date range go through the index: totals come from its prefix
+    sums, the other queries aggregate only the rows of the range.
+
+    Like `main.smart_piggy_bank`, the store merges transactions repeated across its
+    sources: every initial file and every ingested batch is one source.
+
+    Args:
+        sources (str or list, optional): Statement files to load initially.
+        kopecks (bool): Keep amounts as exact integer kopecks. Defaults to False.
+        dedup (bool): Merge transactions repeated across sources. Defaults to True.
+        window_days (int): Also merge repeats whose dates differ by up to this many days.
+    """
+
+    def __init__(self, sources=None, kopecks: bool = False, dedup: bool = True,
+                 window_days: int = 0):
+        self.kopecks = kopecks
+        self.index = TimeIndex([])
+        self.aggregate = Aggregator(kopecks=kopecks)
+        self.deduplicator = Deduplicator(window_days) if dedup else None
+        self._materialized = {}
+        for filename in expand_sources(sources or []):
+            self.add(import_financial_data(filename, kopecks, records=True), normalized=True)
+
+    def add(self, items: list, normalized: bool = False) -> int:
+        """
+        Ingests new transactions and updates the aggregates incrementally.
+
+        Raw records are validated before any of them is ingested, so a rejected batch
+        leaves the store unchanged.
+
+        Args:
+            items (list): Raw records with 'date', 'amount' and 'description'.
+            normalized (bool): The items are already in the readers' format.
+
+        Returns:
+            int: Number of ingested transactions, without merged duplicates.
+
+        Raises:
+            ValueError: If a raw record has no amount or no valid date.
+        """
+        if not normalized:
+            items = [self._normalize(i, item) for i, item in enumerate(items)]
+        if self.deduplicator is not None:
+            self.deduplicator.start_source()
+            items = self.deduplicator.filter(items)
+        categorize_all_transactions(items)
+        self.index.extend(items)
+        self.aggregate.update(items)
+        self._materialized.clear()
+        return len(items)
+
+    def _normalize(self, i: int, item: dict):
+        for key in ('date', 'amount'):
+            if item.get(key) is None:
+                raise ValueError(f"transaction {i}: missing {key}")
+        transaction = normalize_transaction(item, self.kopecks, records=True)
+        if transaction["ordinal"] is None:
+            raise ValueError(f"transaction {i}: invalid date {item.get('date')!r}")
+        return transaction
+
+    def query(self, name: str, start=None, end=None):
+        """
+        Returns the result of a named query, computing it only if the data has changed.
+
+        Results over a date range are computed on every call. 'stats' over a range is
+        answered from the prefix sums of the index in O(log n); with float amounts
+        its totals may then differ from a full aggregation in the last digits.
+
+        Args:
+            name (str): One of the keys of `QUERIES`.
+            start (str, optional): First day ('YYYY-MM-DD') of the range to query.
+            end (str, optional): Last day of the range to query.
+
+        Returns:
+            dict: The query result in the shape of the underlying analytics function.
+
+        Raises:
+            ValueError: If a range boundary is not a valid date.
+        """
+        if start is not None or end is not None:
+            if name == "stats":
+                totals = self.index.totals(start, end)
+                for key in ("total_income", "total_expense", "balance"):
+                    totals[key] = self.aggregate.money(totals[key])
+                return totals
+            return QUERIES[name](aggregate_transactions(self.index.between(start, end),
+                                                        kopecks=self.kopecks))
+        if name not in self._materialized:
+            self._materialized[name] = QUERIES[name](self.aggregate)
+        return self._materialized[name]
+
+
+def _budget(aggregate: Aggregator) -> dict:
+    analysis = analyze_historical_spending(None, aggregate)
+    budget = create_budget_template(analysis, aggregate.money(aggregate.total_income),
+                                    aggregate.kopecks)
+    return compare_budget_vs_actual(budget, None, aggregate)
+
+
+QUERIES = {
+    "stats": lambda aggregate: calculate_basic_stats(None, aggregate),
+    "categories": lambda aggregate: calculate_by_category(None, aggregate),
+    "months": lambda aggregate: analyze_by_time(None, aggregate),
+    "quarters": lambda aggregate: analyze_seasonal_trends(None, aggregate),
+    "history": lambda aggregate: analyze_historical_spending(None, aggregate),
+    "budget": _budget
+}
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}
+
+
+def handle_request(store: TransactionStore, method: str, path: str, body: bytes) -> tuple:
+    """
+    Routes one HTTP request to the store.
+
+    GET /<query> returns a materialized query result, or with `?start=&end=`
+    ('YYYY-MM-DD', either may be omitted) the result over that date range.
+    POST /ingest adds the transactions of a JSON body (a list or an object with a
+    'transactions' list); a batch with a record that has no amount or no valid
+    date is rejected whole with 400.
+
+    Returns:
+        tuple: (status code, JSON-serializable payload).
+    """
+    url = urlsplit(path)
+    name = url.path.strip("/")
+    params = parse_qs(url.query)
+    if name == "ingest":
+        if method != "POST":
+            return 405, {"error": "use POST"}
+        try:
+            payload = json.loads(body or b"[]")
+            items = payload.get("transactions", []) if isinstance(payload, dict) else payload
+            return 200, {"ingested": store.add(items)}
+        except (ValueError, TypeError, AttributeError) as e:
+            return 400, {"error": str(e)}
+    if name not in QUERIES:
+        return 404, {"error": "unknown endpoint", "endpoints": list(QUERIES) + ["ingest"]}
+    if method != "GET":
+        return 405, {"error": "use GET"}
+    try:
+        return 200, store.query(name, params.get("start", [None])[0],
+                                params.get("end", [None])[0])
+    except ValueError as e:
+        return 400, {"error": str(e)}
+
+
+async def _serve_connection(store: TransactionStore, reader, writer):
+    try:
+        request_line = await reader.readline()
+        parts = request_line.decode('latin-1').split()
+        if len(parts) < 2:
+            return
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode('latin-1').partition(":")
+            headers[key.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+        status, payload = handle_request(store, parts[0].upper(), parts[1], body)
+        content = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                     "Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(content)}\r\n"
+                     "Connection: close\r\n\r\n".encode('latin-1') + content)
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(store: TransactionStore, host: str = "127.0.0.1", port: int = 8765,
+                unix_path: str = None):
+    """
+    Serves the store over HTTP on a TCP port or a Unix socket until cancelled.
+
+    Args:
+        store (TransactionStore): The loaded store.
+        host (str): Interface to listen on. Defaults to '127.0.0.1'.
+        port (int): TCP port. Defaults to 8765.
+        unix_path (str, optional): Listen on this Unix socket instead of TCP.
+    """
+    def handler(reader, writer):
+        return _serve_connection(store, reader, writer)
+
+    if unix_path:
+        server = await asyncio.start_unix_server(handler, path=unix_path)
+    else:
+        server = await asyncio.start_server(handler, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    """
+    Command-line entry point of the report service.
+
+    Args:
+        argv (list, optional): Command-line arguments. Defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Smart piggy bank report service")
+    parser.add_argument("sources", nargs="*", help="statement files, directories or patterns")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="path of a Unix socket to listen on")
+    parser.add_argument("--kopecks", action="store_true",
+                        help="sum amounts as exact integer kopecks")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="keep transactions repeated across sources and ingested batches")
+    parser.add_argument("--dedup-window", type=int, default=0,
+                        help="merge repeats whose dates differ by up to this many days")
+    parser.add_argument("--merchants", default=None,
+                        help="merchant dictionary (binary, or CSV with merchant and "
+                             "category columns) resolved before the keyword rules")
+    args = parser.parse_args(argv)
+    default_cache.use_merchant_file(args.merchants)
+    store = TransactionStore(args.sources, args.kopecks, not args.no_dedup, args.dedup_window)
+    try:
+        asyncio.run(serve(store, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+import math
+from collections import Counter
+
+
+class SpaceSaving:
+    """
+    Space-saving summary of the most frequent items of a stream.
+
+    At most `capacity` items are counted. When a new item arrives at a full summary,
+    it replaces the item with the smallest count and inherits that count as its
+    overestimation error, so every count is an upper bound off by at most its error.
+    While fewer than `capacity` distinct items have been seen, counts are exact.
+
+    Args:
+        capacity (int): Maximum number of counted items. Defaults to 16.
+    """
+
+    def __init__(self, capacity: int = 16):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def update(self, item, count: int = 1):
+        """
+        Counts `count` occurrences of `item`.
+        """
+        counts = self.counts
+        if item in counts:
+            counts[item] += count
+        elif len(counts) < self.capacity:
+            counts[item] = count
+            self.errors[item] = 0
+        else:
+            victim = min(counts, key=counts.get)
+            floor = counts.pop(victim)
+            del self.errors[victim]
+            counts[item] = floor + count
+            self.errors[item] = floor
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """
+        Adds the counts of another summary, keeping the `capacity` largest.
+
+        Returns:
+            SpaceSaving: The summary itself, to allow chaining.
+        """
+        for item, count in other.counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+            self.errors[item] = self.errors.get(item, 0) + other.errors[item]
+        if len(self.counts) > self.capacity:
+            kept = {item for item, _ in Counter(self.counts).most_common(self.capacity)}
+            self.counts = {item: count for item, count in self.counts.items() if item in kept}
+            self.errors = {item: self.errors[item] for item in self.counts}
+        return self
+
+    def most_common(self, n: int = None) -> list:
+        """
+        Returns the `n` items with the highest counts, like `Counter.most_common`.
+        """
+        return Counter(self.counts).most_common(n)
+
+    def to_dict(self) -> dict:
+        return {"capacity": self.capacity, "counts": self.counts, "errors": self.errors}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpaceSaving":
+        summary = cls(data["capacity"])
+        summary.counts = dict(data["counts"])
+        summary.errors = dict(data["errors"])
+        return summary
+
+
+class RunningStats:
+    """
+    Count, mean, variance, minimum and maximum of a stream in constant memory.
+
+    The mean and the sum of squared deviations are updated with Welford's method and
+    combined with Chan's formula on merge, which stays accurate on long streams.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def update(self, value: float):
+        """
+        Adds one value.
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        """
+        Combines the statistics of another stream.
+
+        Returns:
+            RunningStats: The statistics themselves, to allow chaining.
+        """
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    @property
+    def variance(self) -> float:
+        """
+        Sample variance, 0 for fewer than two values.
+        """
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        """
+        Sample standard deviation.
+        """
+        return math.sqrt(self.variance)
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "minimum": self.minimum, "maximum": self.maximum}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunningStats":
+        stats = cls()
+        for name in vars(stats):
+            setattr(stats, name, data[name])
+        return stats
+
+
+class QuantileSketch:
+    """
+    Quantile sketch of non-negative values with a relative error guarantee.
+
+    Values are counted in logarithmic buckets: bucket i holds the values in
+    (gamma^(i-1), gamma^i] with gamma = (1 + a) / (1 - a), so any quantile is
+    returned within a relative error `a` of the true value. The number of buckets
+    grows with the logarithm of the value range only; past `max_buckets` the lowest
+    buckets are folded together, which sacrifices accuracy on the smallest values.
+
+    Args:
+        relative_accuracy (float): Relative error `a` of the quantiles. Defaults to 1%.
+        max_buckets (int): Maximum number of buckets. Defaults to 2048.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def key(self, value: float) -> int:
+        """
+        Returns the index of the bucket holding a positive value.
+        """
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def update(self, value: float, count: int = 1):
+        """
+        Adds `count` occurrences of a non-negative value.
+        """
+        if value > 0:
+            index = self.key(value)
+            self.bins[index] = self.bins.get(index, 0) + count
+            if len(self.bins) > self.max_buckets:
+                self._collapse()
+        else:
+            self.zero_count += count
+        self.count += count
+
+    def add_buckets(self, buckets: dict, zero_count: int = 0):
+        """
+        Adds precomputed bucket counts, e.g. from a vectorized pass over an array.
+
+        Args:
+            buckets (dict): Bucket indexes (see `key`) mapped to value counts.
+            zero_count (int): Number of zero values.
+        """
+        for index, count in buckets.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += zero_count
+        self.count += sum(buckets.values()) + zero_count
+        self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.bins)
+        excess = len(keys) - self.max_buckets
+        if excess <= 0:
+            return
+        target = keys[excess]
+        for index in keys[:excess]:
+            self.bins[target] += self.bins.pop(index)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """
+        Adds the values of another sketch with the same accuracy.
+
+        Returns:
+            QuantileSketch: The sketch itself, to allow chaining.
+
+        Raises:
+            ValueError: If the sketches have different accuracies.
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("cannot merge quantile sketches of different accuracy")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self._collapse()
+        return self
+
+    def quantile(self, q: float) -> float:
+        """
+        Returns an estimate of the q-quantile (0 <= q <= 1), or None if the sketch is empty.
+        """
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self) -> dict:
+        return {"relative_accuracy": self.relative_accuracy, "max_buckets": self.max_buckets,
+                "bins": {str(index): count for index, count in self.bins.items()},
+                "zero_count": self.zero_count, "count": self.count}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data["relative_accuracy"], data["max_buckets"])
+        sketch.bins = {int(index): count for index, count in data["bins"].items()}
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        return sketch
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+from analytics import Aggregator
+from categories import categorize_all_transactions, category_table_hash
+from data import expand_sources, iter_chunks, iter_csv_range, iter_json_file
+
+STATE_VERSION = 3
+_TAIL_BYTES = 1 << 16
+
+
+def _tail_hash(filename: str, offset: int) -> str:
+    """
+    Hashes the bytes just before `offset`, to detect rewritten files cheaply.
+    """
+    with open(filename, 'rb') as file:
+        file.seek(max(offset - _TAIL_BYTES, 0))
+        return hashlib.sha256(file.read(offset - file.tell())).hexdigest()
+
+
+def _complete_size(filename: str) -> int:
+    """
+    Returns the offset just past the last newline, ignoring a partially written line.
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as file:
+        position = size
+        while position > 0:
+            start = max(position - _TAIL_BYTES, 0)
+            file.seek(start)
+            block = file.read(position - start)
+            newline = block.rfind(b'\n')
+            if newline >= 0:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+def load_state(state_file: str, sketch: bool = False, kopecks: bool = False) -> dict:
+    """
+    Reads a saved processing state, returning an empty one if it is missing or stale.
+
+    Args:
+        state_file (str): Path to the state file.
+        sketch (bool): Whether the aggregates must be in sketch mode.
+        kopecks (bool): Whether the aggregates must hold integer kopecks.
+
+    Returns:
+        dict: The state with per-source offsets and aggregates.
+    """
+    state = None
+    try:
+        with open(state_file, 'r', encoding='utf-8') as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        pass
+    if (not state or state.get("version") != STATE_VERSION
+            or state.get("categories_hash") != category_table_hash()
+            or state.get("sketch", False) != sketch
+            or state.get("kopecks", False) != kopecks):
+        state = {"version": STATE_VERSION, "categories_hash": category_table_hash(),
+                 "sketch": sketch, "kopecks": kopecks, "sources": {}}
+    return state
+
+
+def save_state(state_file: str, state: dict):
+    """
+    Writes the processing state atomically.
+
+    Args:
+        state_file (str): Path to the state file.
+        state (dict): The state to save.
+    """
+    staging = state_file + ".tmp"
+    with open(staging, 'w', encoding='utf-8') as file:
+        json.dump(state, file, ensure_ascii=False)
+    os.replace(staging, state_file)
+
+
+def resume_offset(filename: str, source: dict) -> int:
+    """
+    Returns the saved position of a source if the file still matches it.
+
+    Args:
+        filename (str): Path to the CSV or JSON statement.
+        source (dict): Saved 'offset' and 'tail_hash' of the source, or empty.
+
+    Returns:
+        int: The saved offset, or 0 if there is none or the file was rewritten.
+    """
+    offset = source.get("offset", 0)
+    if offset and (os.path.getsize(filename) < offset
+                   or _tail_hash(filename, offset) != source.get("tail_hash")):
+        return 0
+    return offset
+
+
+def iter_appended(filename: str, offset: int = 0, kopecks: bool = False,
+                  progress: dict = None):
+    """
+    Reads the transactions of a CSV or JSON statement past a saved position.
+
+    A partially written last CSV line is left for the next read.
+
+    Args:
+        filename (str): Path to the statement.
+        offset (int): Position returned by `resume_offset`. Defaults to 0.
+        kopecks (bool): Read amounts as exact integer kopecks.
+        progress (dict, optional): Filled with 'offset' and 'tail_hash' of the
+            position just past the last row read, once reading stops.
+
+    Yields:
+        dict: Transactions in the readers' format. Nothing is yielded for other
+        file types.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".csv":
+        end = _complete_size(filename)
+        yield from iter_csv_range(filename, offset, end, kopecks)
+    elif ext == ".json":
+        positions = {}
+        yield from iter_json_file(filename, kopecks, offset, positions)
+        end = positions.get("offset", offset)
+    else:
+        return
+    if progress is not None:
+        progress.update(offset=end, tail_hash=_tail_hash(filename, end))
+
+
+def update_state(sources, state_file: str, sketch: bool = False,
+                 kopecks: bool = False) -> Aggregator:
+    """
+    Brings the saved aggregates up to date with the appended rows of statement files.
+
+    Each source keeps its own aggregates and the position up to which it has been
+    processed: the byte offset just past the last complete CSV line or JSON array item.
+    Only rows past that position are parsed and categorized; a JSON file is expected
+    to grow by items inserted before the closing bracket of its 'transactions' array.
+    A source whose processed part no longer matches, or a change of the category
+    table, triggers a full recompute of that source. The per-source aggregates are
+    merged in source order, so the result matches a fresh run over the same files.
+
+    Args:
+        sources (str or list): Paths, directories or glob patterns.
+        state_file (str): Path to the state file.
+        sketch (bool): Keep sketch-mode aggregates. Switching modes recomputes all sources.
+        kopecks (bool): Keep integer kopeck aggregates. Switching recomputes all sources.
+
+    Returns:
+        Aggregator: Aggregates of all transactions in the sources.
+    """
+    state = load_state(state_file, sketch, kopecks)
+    updated = {}
+    result = Aggregator(sketch, kopecks=kopecks)
+    for filename in expand_sources(sources):
+        if not os.path.exists(filename):
+            continue
+        if os.path.splitext(filename)[1].lower() not in (".csv", ".json"):
+            continue
+        path = os.path.abspath(filename)
+        source = state["sources"].get(path, {})
+        offset = resume_offset(filename, source)
+        aggregate = (Aggregator.from_dict(source["aggregate"]) if offset
+                     else Aggregator(sketch, kopecks=kopecks))
+        progress = {}
+        for chunk in iter_chunks(iter_appended(filename, offset, kopecks, progress)):
+            aggregate.update(categorize_all_transactions(chunk))
+        source = dict(progress, aggregate=aggregate.to_dict())
+        updated[path] = source
+        result.merge(Aggregator.from_dict(source["aggregate"]))
+    state["sources"] = updated
+    save_state(state_file, state)
+    return result
@@ -0,0 +1,511 @@
+import csv
+import datetime
+import math
+import sys
+import numpy as np
+import local as lcl
+from analytics import Aggregator
+from categories import CategoryCache, default_cache, all_categories, priority_categories
+from data import date_fields, parse_date, to_ordinal
+from money import parse_kopecks
+from sketches import QuantileSketch, RunningStats, SpaceSaving
+
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+class StringColumn:
+    """
+    Read-only sequence of strings stored as one UTF-8 buffer plus end offsets.
+
+    Strings are decoded only when accessed, so the column can be memory-mapped
+    from disk without materializing every description.
+
+    Args:
+        data (array-like): uint8 buffer holding the encoded strings back to back.
+        offsets (array-like): int64 end offset of every string in `data`.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings) -> "StringColumn":
+        """
+        Encodes a sequence of strings into a column.
+
+        Args:
+            strings (iterable): The strings to store.
+
+        Returns:
+            StringColumn: The encoded column.
+        """
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.cumsum([len(e) for e in encoded], dtype=np.int64)
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, row: int) -> str:
+        start = int(self.offsets[row - 1]) if row > 0 else 0
+        return bytes(self.data[start:int(self.offsets[row])]).decode('utf-8')
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+
+class TransactionTable:
+    """
+    Columnar, NumPy-backed storage for transactions.
+
+    Amounts are kept as float64 rubles, or as int64 kopecks in kopeck mode, dates as
+    int32 day ordinals (0 for an invalid date)
+    and categories as int16 codes into the `categories` list. Descriptions are stored
+    as interned strings, so repeated statement lines share one object, or as a
+    `StringColumn` when the table is loaded from disk.
+
+    Args:
+        amounts (array-like): Transaction amounts, float rubles or integer kopecks.
+        ordinals (array-like): Day ordinals of the transaction dates, 0 if invalid.
+        descriptions (list or StringColumn): Transaction descriptions.
+        category_codes (array-like, optional): Category codes, -1 for uncategorized rows.
+        categories (list, optional): Category names the codes refer to.
+        raw_dates (dict, optional): Original strings of invalid dates by row index.
+        kopecks (bool): The amounts are integer kopecks. Defaults to False (rubles,
+            even when they are given as integers).
+    """
+
+    def __init__(self, amounts, ordinals, descriptions, category_codes=None,
+                 categories=None, raw_dates=None, kopecks: bool = False):
+        self.kopecks = kopecks
+        self.amounts = np.asarray(amounts, dtype=np.int64 if kopecks else np.float64)
+        self.ordinals = np.asarray(ordinals, dtype=np.int32)
+        if not isinstance(descriptions, StringColumn):
+            descriptions = [sys.intern(d) for d in descriptions]
+        self.descriptions = descriptions
+        if category_codes is None:
+            category_codes = np.full(len(self.amounts), -1)
+        self.category_codes = np.asarray(category_codes, dtype=np.int16)
+        self.categories = list(categories or [])
+        self.raw_dates = dict(raw_dates or {})
+
+    @classmethod
+    def from_transactions(cls, transactions, kopecks: bool = False) -> "TransactionTable":
+        """
+        Builds a table from transaction dictionaries.
+
+        Args:
+            transactions (iterable): Transaction dictionaries.
+            kopecks (bool): The amounts are integer kopecks. Defaults to False.
+
+        Returns:
+            TransactionTable: The columnar copy of the transactions.
+        """
+        amounts = []
+        ordinals = []
+        descriptions = []
+        codes = []
+        category_index = {}
+        raw_dates = {}
+        for row, t in enumerate(transactions):
+            amounts.append(t["amount"])
+            fields = date_fields(t)
+            if fields is None:
+                ordinals.append(0)
+                raw_dates[row] = t.get("date", "")
+            else:
+                ordinals.append(fields[0])
+            descriptions.append(t.get("description", ""))
+            cat = t.get("category")
+            if cat is None:
+                codes.append(-1)
+            else:
+                codes.append(category_index.setdefault(cat, len(category_index)))
+        return cls(amounts, ordinals, descriptions, codes, list(category_index), raw_dates,
+                   kopecks)
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def __iter__(self):
+        income_label = f'{lcl.INCOME_LABEL}'
+        expense_label = f'{lcl.EXPENSE_LABEL}'
+        categories = self.categories
+        for row, (amount, ordinal, code) in enumerate(zip(self.amounts.tolist(),
+                                                          self.ordinals.tolist(),
+                                                          self.category_codes.tolist())):
+            if ordinal:
+                d = datetime.date.fromordinal(ordinal)
+                transaction = {'date': d.isoformat(), 'ordinal': ordinal, 'year': d.year,
+                               'month': d.month, 'quarter': (d.month - 1) // 3 + 1}
+            else:
+                transaction = {'date': self.raw_dates.get(row, ''), 'ordinal': None,
+                               'year': None, 'month': None, 'quarter': None}
+            transaction['amount'] = amount
+            transaction['description'] = self.descriptions[row]
+            transaction['type'] = income_label if amount >= 0 else expense_label
+            if code >= 0:
+                transaction['category'] = categories[code]
+            yield transaction
+
+    def take(self, rows) -> "TransactionTable":
+        """
+        Returns a new table with the given rows.
+
+        Args:
+            rows (array-like): Row positions to keep, in the desired order.
+
+        Returns:
+            TransactionTable: The selected rows.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        positions = rows.tolist()
+        raw_dates = {new: self.raw_dates[old] for new, old in enumerate(positions)
+                     if old in self.raw_dates}
+        return TransactionTable(self.amounts[rows], self.ordinals[rows],
+                                [self.descriptions[row] for row in positions],
+                                self.category_codes[rows], self.categories, raw_dates,
+                                self.kopecks)
+
+    def between(self, start=None, end=None) -> "TransactionTable":
+        """
+        Returns the rows dated within [start, end], both ends inclusive.
+
+        Args:
+            start (str, datetime.date or int, optional): First day of the range.
+            end (str, datetime.date or int, optional): Last day of the range.
+
+        Returns:
+            TransactionTable: The matching rows in their original order.
+        """
+        start, end = to_ordinal(start), to_ordinal(end)
+        mask = self.ordinals > 0
+        if start is not None:
+            mask &= self.ordinals >= start
+        if end is not None:
+            mask &= self.ordinals <= end
+        return self.take(np.flatnonzero(mask))
+
+    def categorize(self, cache: CategoryCache = None) -> "TransactionTable":
+        """
+        Categorizes the table, resolving each distinct description only once.
+
+        Args:
+            cache (CategoryCache, optional): Cache to resolve descriptions through.
+                Defaults to the module-level cache shared across runs.
+
+        Returns:
+            TransactionTable: The table itself, with category codes filled in.
+        """
+        if cache is None:
+            cache = default_cache
+        cache.bind(all_categories(), priority_categories())
+        category_index = {}
+        description_codes = {}
+        codes = np.empty(len(self.descriptions), dtype=np.int16)
+        for row, desc in enumerate(self.descriptions):
+            code = description_codes.get(desc)
+            if code is None:
+                cat = cache.categorize(desc)
+                code = description_codes[desc] = category_index.setdefault(cat, len(category_index))
+            codes[row] = code
+        self.category_codes = codes
+        self.categories = list(category_index)
+        return self
+
+    def aggregate(self, sketch: bool = False) -> Aggregator:
+        """
+        Computes the same aggregates as `analytics.Aggregator` with vectorized group-bys.
+
+        `np.bincount` adds weights in row order, so every sum matches the sequential
+        Python sum of the dict-based path exactly, and dictionaries are filled in the
+        order in which their keys first appear in the rows. Integer kopeck columns are
+        summed exactly as integers, see `_group_sums`.
+
+        Args:
+            sketch (bool): Also build the sketch-mode summaries. Their statistics are
+                computed from whole columns, so they may differ from the row-by-row
+                sketches in the last digits.
+
+        Returns:
+            Aggregator: The filled aggregator.
+        """
+        result = self._aggregate()
+        if sketch:
+            self._attach_sketches(result)
+        return result
+
+    def _attach_sketches(self, result: Aggregator):
+        result.sketch = True
+        for buckets in (result.months, result.quarters):
+            for bucket in buckets.values():
+                summary = SpaceSaving(result.top_k)
+                for cat, count in bucket["categories"].items():
+                    summary.update(cat, count)
+                bucket["categories"] = summary
+        names = self.categories + [f'{lcl.NO_CATEGORY}']
+        codes = self.category_codes.astype(np.int64)
+        codes[codes < 0] = len(names) - 1
+        expense = self.amounts < 0
+        spent = np.abs(self.amounts[expense])
+        expense_codes = codes[expense]
+        order = np.argsort(expense_codes, kind="stable")
+        sorted_spent = spent[order]
+        bounds = np.searchsorted(expense_codes[order], np.arange(len(names) + 1))
+        for code in _first_seen(expense_codes):
+            values = sorted_spent[bounds[code]:bounds[code + 1]]
+            mean = float(values.mean())
+            stats = RunningStats.from_dict({"count": len(values), "mean": mean,
+                                            "m2": float(((values - mean) ** 2).sum()),
+                                            "minimum": float(values.min()),
+                                            "maximum": float(values.max())})
+            quantiles = QuantileSketch()
+            positive = values[values > 0]
+            keys, counts = np.unique(np.ceil(np.log(positive) / math.log(quantiles.gamma)),
+                                     return_counts=True)
+            quantiles.add_buckets(dict(zip(keys.astype(np.int64).tolist(), counts.tolist())),
+                                  len(values) - len(positive))
+            result.category_stats[names[code]] = stats
+            result.category_quantiles[names[code]] = quantiles
+
+    def _aggregate(self) -> Aggregator:
+        result = Aggregator(kopecks=self.kopecks)
+        n = len(self.amounts)
+        if not n:
+            return result
+        amounts = self.amounts
+        names = self.categories + [f'{lcl.NO_CATEGORY}']
+        codes = self.category_codes.astype(np.int64)
+        codes[codes < 0] = len(names) - 1
+        income = amounts > 0
+        expense = amounts < 0
+
+        result.transaction_count = n
+        result.income_transactions = int(np.count_nonzero(income))
+        result.expense_transactions = int(np.count_nonzero(expense))
+        if result.income_transactions:
+            result.total_income = _ordered_sum(amounts[income])
+        if result.expense_transactions:
+            result.total_expense = _ordered_sum(amounts[expense])
+
+        sums = _group_sums(codes, amounts, len(names))
+        counts = np.bincount(codes, minlength=len(names)).tolist()
+        for code in _first_seen(codes):
+            result.categories[names[code]] = {"sum": sums[code], "count": counts[code]}
+
+        spent = np.abs(amounts[expense])
+        expense_codes = codes[expense]
+        expense_sums = _group_sums(expense_codes, spent, len(names))
+        for code in _first_seen(expense_codes):
+            result.category_expenses[names[code]] = expense_sums[code]
+
+        valid = self.ordinals > 0
+        result.invalid_dates = int(n - np.count_nonzero(valid))
+        if not valid.any():
+            return result
+        months = (self.ordinals[valid].astype(np.int64) - _EPOCH_ORDINAL).astype(
+            'datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        month_names = {m: f"{m // 12 + 1970}-{m % 12 + 1:02d}" for m in np.unique(months).tolist()}
+        quarters = months // 3
+        quarter_names = {q: f"{q // 4 + 1970}-Q{q % 4 + 1}" for q in np.unique(quarters).tolist()}
+        valid_amounts = amounts[valid]
+        valid_codes = codes[valid]
+        _fill_buckets(result.months, months, month_names, valid_amounts, valid_codes, names)
+        _fill_buckets(result.quarters, quarters, quarter_names, valid_amounts, valid_codes, names)
+
+        negative = valid_amounts < 0
+        month_count = int(months.max() - months.min() + 1)
+        month_offsets = months[negative] - months.min()
+        keys = valid_codes[negative] * month_count + month_offsets
+        if len(keys):
+            spending = _group_sums(keys, np.abs(valid_amounts[negative]))
+            for key in _first_seen(keys):
+                code, offset = divmod(key, month_count)
+                month = month_names[offset + int(months.min())]
+                result.category_months.setdefault(names[code], {})[month] = spending[key]
+        return result
+
+
+def _ordered_sum(values):
+    """
+    Sums values in row order, matching a sequential Python sum bit for bit.
+    """
+    if values.dtype.kind == 'i':
+        return int(values.sum())
+    return float(np.bincount(np.zeros(len(values), dtype=np.intp), weights=values)[0])
+
+
+def _group_sums(keys, weights, minlength: int = 0) -> list:
+    """
+    Sums weights per key like `np.bincount`, exactly for integer weights.
+
+    `np.bincount` adds in float64, which is exact for integers while every partial
+    sum stays below 2**53; larger integer columns are added up with `np.add.at`.
+    """
+    if weights.dtype.kind != 'i':
+        return np.bincount(keys, weights=weights, minlength=minlength).tolist()
+    if np.abs(weights).sum(dtype=np.float64) < 2.0 ** 52:
+        sums = np.bincount(keys, weights=weights, minlength=minlength)
+        return sums.astype(np.int64).tolist()
+    sums = np.zeros(max(minlength, int(keys.max()) + 1 if len(keys) else 0), dtype=np.int64)
+    np.add.at(sums, keys, weights)
+    return sums.tolist()
+
+
+def _first_seen(keys) -> list:
+    """
+    Returns the distinct keys ordered by their first occurrence.
+    """
+    unique, first = np.unique(keys, return_index=True)
+    return unique[np.argsort(first, kind="stable")].tolist()
+
+
+def _fill_buckets(buckets: dict, ids, id_names: dict, amounts, codes, names: list):
+    """
+    Fills monthly or quarterly buckets in the shape `Aggregator` uses.
+    """
+    base = int(ids.min())
+    offsets = ids - base
+    size = int(offsets.max()) + 1
+    nonnegative = amounts >= 0
+    income = _group_sums(offsets[nonnegative], amounts[nonnegative], size)
+    expenses = _group_sums(offsets[~nonnegative], amounts[~nonnegative], size)
+    negative_offsets = offsets[~nonnegative]
+    order = np.argsort(negative_offsets, kind="stable")
+    sorted_offsets = negative_offsets[order]
+    sorted_codes = codes[~nonnegative][order]
+    bounds = np.searchsorted(sorted_offsets, np.arange(size + 1))
+    for offset in _first_seen(offsets):
+        segment = sorted_codes[bounds[offset]:bounds[offset + 1]]
+        counts = {}
+        if len(segment):
+            tally = np.bincount(segment).tolist()
+            counts = {names[code]: tally[code] for code in _first_seen(segment)}
+        buckets[id_names[offset + base]] = {
+            "income": income[offset],
+            "expenses": expenses[offset],
+            "categories": counts
+        }
+
+
+def _append_amounts(columns: list, values: list):
+    """
+    Converts a block of amount strings and appends it to `columns`.
+
+    If a value is not a number, the values before it are still appended and
+    the ValueError is re-raised.
+    """
+    try:
+        columns.append(np.array(values, dtype=np.float64))
+    except ValueError:
+        good = []
+        try:
+            for value in values:
+                good.append(float(value))
+        finally:
+            columns.append(np.array(good, dtype=np.float64))
+
+
+def _append_kopecks(columns: list, values: list):
+    """
+    Converts a block of amount strings to int64 kopecks and appends it to `columns`.
+
+    The block is parsed as float64 and scaled by 100 in one pass. A scaled value
+    within float rounding error of a whole number proves that its string had at most
+    two decimals, so rounding it gives the exact kopecks. Only the other rows (more
+    decimals, ',' separators, amounts of 2**50 kopecks and more) go through
+    `money.parse_kopecks`. Errors are handled like in `_append_amounts`.
+    """
+    try:
+        scaled = np.array(values, dtype=np.float64) * 100
+    except ValueError:
+        good = []
+        try:
+            for value in values:
+                good.append(parse_kopecks(value))
+        finally:
+            columns.append(np.array(good, dtype=np.int64))
+        return
+    rounded = np.rint(scaled)
+    exact = ((np.abs(scaled - rounded) <= np.abs(rounded) * 2.0 ** -51)
+             & (np.abs(rounded) < 2.0 ** 50))
+    block = np.where(exact, rounded, 0).astype(np.int64)
+    for row in np.flatnonzero(~exact).tolist():
+        try:
+            block[row] = parse_kopecks(values[row])
+        except ValueError:
+            columns.append(block[:row])
+            raise
+    columns.append(block)
+
+
+def read_csv_table(filename: str, block_size: int = 1 << 22,
+                   kopecks: bool = False) -> TransactionTable:
+    """
+    Reads a CSV statement straight into a columnar table.
+
+    Header positions are resolved once, the file is read in blocks of whole lines
+    and parsed with a positional `csv.reader`, so no dictionary is built per row.
+    Amounts are converted block by block with NumPy and dates go through the
+    memoized `data.parse_date`. Errors are reported like in `data.read_csv_file`:
+    the rows read before the error are kept.
+
+    Blocks are cut at line ends, so quoted fields spanning several lines are not
+    supported; the byte ranges of `data.csv_byte_ranges` have the same limit.
+
+    Args:
+        filename (str): Path to the CSV file.
+        block_size (int): Approximate number of bytes per block. Defaults to 4 MiB.
+        kopecks (bool): Read amounts as exact int64 kopecks. Defaults to False.
+
+    Returns:
+        TransactionTable: The uncategorized transactions of the file.
+    """
+    amounts = []
+    ordinals = []
+    descriptions = []
+    raw_dates = {}
+    intern = sys.intern
+    append_amounts = _append_kopecks if kopecks else _append_amounts
+    try:
+        with open(filename, 'r', encoding='utf-8') as file:
+            header = next(csv.reader([file.readline()]), [])
+            date_col = header.index('date')
+            amount_col = header.index('amount')
+            description_col = header.index('description')
+            while True:
+                lines = file.readlines(block_size)
+                if not lines:
+                    break
+                block_amounts = []
+                try:
+                    for row in csv.reader(lines):
+                        if not row:
+                            continue
+                        date = row[date_col].strip()
+                        amount = row[amount_col]
+                        description = row[description_col].strip()
+                        fields = parse_date(date)
+                        if fields is None:
+                            raw_dates[len(ordinals)] = date
+                            ordinals.append(0)
+                        else:
+                            ordinals.append(fields[0])
+                        descriptions.append(intern(description))
+                        block_amounts.append(amount)
+                finally:
+                    append_amounts(amounts, block_amounts)
+    except csv.Error as e:
+            print(f' {lcl.FILE_ERROR} {filename}: {e}')
+    except Exception as e:
+            print(f' {lcl.FILE_EXCEPTION} {filename}: {e}')
+    rows = sum(len(block) for block in amounts)
+    del ordinals[rows:], descriptions[rows:]
+    raw_dates = {row: date for row, date in raw_dates.items() if row < rows}
+    if raw_dates:
+        print(f' {lcl.INVALID_DATES} {filename}: {len(raw_dates)}')
+    empty = np.empty(0, dtype=np.int64 if kopecks else np.float64)
+    return TransactionTable(np.concatenate(amounts) if amounts else empty, ordinals,
+                            descriptions, raw_dates=raw_dates, kopecks=kopecks)
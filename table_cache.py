@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from categories import category_table_hash
+from data import import_financial_data
+from table import StringColumn, TransactionTable, read_csv_table
+
+CACHE_VERSION = 1
+_COLUMNS = ("amounts", "ordinals", "category_codes", "description_data", "description_offsets")
+
+
+def file_hash(filename: str) -> str:
+    """
+    Returns the SHA-256 digest of a file's contents.
+
+    Args:
+        filename (str): Path to the file.
+
+    Returns:
+        str: Hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _entry_dir(cache_dir: str, filename: str) -> str:
+    key = hashlib.sha256(os.path.abspath(filename).encode('utf-8')).hexdigest()[:32]
+    return os.path.join(cache_dir, key)
+
+
+def _read_meta(entry: str):
+    try:
+        with open(os.path.join(entry, "meta.json"), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(entry: str, meta: dict):
+    with open(os.path.join(entry, "meta.json"), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False)
+
+
+def _load_entry(entry: str, meta: dict) -> TransactionTable:
+    columns = {name: np.load(os.path.join(entry, name + ".npy"), mmap_mode='r')
+               for name in _COLUMNS}
+    descriptions = StringColumn(columns["description_data"], columns["description_offsets"])
+    raw_dates = {int(row): date for row, date in meta["raw_dates"].items()}
+    return TransactionTable(columns["amounts"], columns["ordinals"], descriptions,
+                            columns["category_codes"], meta["categories"], raw_dates,
+                            meta.get("kopecks", False))
+
+
+def _save_entry(entry: str, table: TransactionTable, meta: dict):
+    descriptions = table.descriptions
+    if not isinstance(descriptions, StringColumn):
+        descriptions = StringColumn.from_strings(descriptions)
+    columns = {
+        "amounts": table.amounts,
+        "ordinals": table.ordinals,
+        "category_codes": table.category_codes,
+        "description_data": descriptions.data,
+        "description_offsets": descriptions.offsets
+    }
+    parent = os.path.dirname(entry)
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=parent)
+    try:
+        for name, values in columns.items():
+            np.save(os.path.join(staging, name + ".npy"), np.asarray(values))
+        _write_meta(staging, dict(meta, categories=table.categories,
+                                  raw_dates={str(row): date
+                                             for row, date in table.raw_dates.items()}))
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(staging, entry)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def load_table(filename: str, cache_dir: str = ".piggy_cache",
+               kopecks: bool = False) -> TransactionTable:
+    """
+    Returns the parsed and categorized columns of a statement file, using an on-disk cache.
+
+    Cache entries are keyed on the file path and validated against its size, mtime,
+    content hash and the hash of the category table. A hit memory-maps the stored
+    columns instead of re-reading the source. If only the mtime changed, the content
+    hash decides whether the entry can still be used. An entry stored with the other
+    amount unit (float rubles or integer kopecks) is rebuilt.
+
+    Args:
+        filename (str): Path to a CSV or JSON statement file.
+        cache_dir (str): Directory holding the cache entries. Defaults to '.piggy_cache'.
+        kopecks (bool): Keep amounts as exact int64 kopecks. Defaults to False.
+
+    Returns:
+        TransactionTable: The categorized transactions of the file.
+    """
+    entry = _entry_dir(cache_dir, filename)
+    stat = os.stat(filename)
+    categories_hash = category_table_hash()
+    meta = _read_meta(entry)
+    if (meta and meta.get("version") == CACHE_VERSION
+            and meta.get("path") == os.path.abspath(filename)
+            and meta.get("size") == stat.st_size
+            and meta.get("categories_hash") == categories_hash
+            and meta.get("kopecks", False) == kopecks):
+        if meta.get("mtime_ns") == stat.st_mtime_ns:
+            return _load_entry(entry, meta)
+        if meta.get("content_hash") == file_hash(filename):
+            meta["mtime_ns"] = stat.st_mtime_ns
+            _write_meta(entry, meta)
+            return _load_entry(entry, meta)
+
+    if os.path.splitext(filename)[1].lower() == ".csv":
+        table = read_csv_table(filename, kopecks=kopecks)
+    else:
+        table = TransactionTable.from_transactions(import_financial_data(filename, kopecks),
+                                                   kopecks)
+    table.categorize()
+    _save_entry(entry, table, {
+        "version": CACHE_VERSION,
+        "path": os.path.abspath(filename),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "content_hash": file_hash(filename),
+        "categories_hash": categories_hash,
+        "kopecks": kopecks
+    })
+    return table
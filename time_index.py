@@ -0,0 +1,120 @@
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from data import date_fields, to_ordinal
+
+
+class TimeIndex:
+    """
+    Date-sorted index over transactions for range queries.
+
+    Row positions are sorted by day ordinal, so the rows of any date range are found
+    with two binary searches. Prefix sums of income and expenses over the sorted rows
+    answer range totals in O(log n) without touching the rows at all.
+
+    The index iterates over all transactions in their original order, so it can be
+    passed to the analytics functions in place of the list. It is meant to be kept
+    across queries: building it costs a sort, and `extend` indexes appended rows
+    incrementally when they arrive in date order.
+
+    Args:
+        transactions (list): Transaction dictionaries.
+    """
+
+    def __init__(self, transactions: list):
+        self.transactions = transactions
+        self._clear()
+        self._index(0)
+
+    def _clear(self):
+        self.ordinals = []
+        self.positions = []
+        self._income = [0]
+        self._expense = [0]
+        self._income_count = [0]
+        self._expense_count = [0]
+
+    def _index(self, first: int):
+        transactions = self.transactions
+        keyed = []
+        for position in range(first, len(transactions)):
+            fields = date_fields(transactions[position])
+            if fields is not None:
+                keyed.append((fields[0], position))
+        keyed.sort()
+        if keyed and self.ordinals and keyed[0][0] < self.ordinals[-1]:
+            self._clear()
+            self._index(0)
+            return
+        self.ordinals += [ordinal for ordinal, _ in keyed]
+        self.positions += [position for _, position in keyed]
+        amounts = [transactions[position]["amount"] for _, position in keyed]
+        for prefix, values in ((self._income, (a if a > 0 else 0 for a in amounts)),
+                               (self._expense, (a if a < 0 else 0 for a in amounts)),
+                               (self._income_count, (1 if a > 0 else 0 for a in amounts)),
+                               (self._expense_count, (1 if a < 0 else 0 for a in amounts))):
+            prefix += list(accumulate(values, initial=prefix[-1]))[1:]
+
+    def extend(self, transactions):
+        """
+        Appends transactions to the index.
+
+        Rows dated no earlier than the latest indexed day are merged in without
+        touching the existing index; anything older makes the index rebuild itself.
+
+        Args:
+            transactions (iterable): Transactions to append, in arrival order.
+        """
+        first = len(self.transactions)
+        self.transactions.extend(transactions)
+        self._index(first)
+
+    def __len__(self) -> int:
+        return len(self.transactions)
+
+    def __iter__(self):
+        return iter(self.transactions)
+
+    def _bounds(self, start, end) -> tuple:
+        start, end = to_ordinal(start), to_ordinal(end)
+        lo = 0 if start is None else bisect_left(self.ordinals, start)
+        hi = len(self.ordinals) if end is None else bisect_right(self.ordinals, end)
+        return lo, max(lo, hi)
+
+    def between(self, start=None, end=None) -> list:
+        """
+        Returns the transactions dated within [start, end], both ends inclusive.
+
+        Args:
+            start (str, datetime.date or int, optional): First day of the range.
+            end (str, datetime.date or int, optional): Last day of the range.
+
+        Returns:
+            list: The matching transactions in their original order.
+        """
+        lo, hi = self._bounds(start, end)
+        return [self.transactions[position] for position in sorted(self.positions[lo:hi])]
+
+    def totals(self, start=None, end=None) -> dict:
+        """
+        Returns income and expense totals of a date range from the prefix sums.
+
+        Args:
+            start (str, datetime.date or int, optional): First day of the range.
+            end (str, datetime.date or int, optional): Last day of the range.
+
+        Returns:
+            dict: The same keys as `analytics.calculate_basic_stats`, with amounts in
+            the unit of the transactions. With integer kopecks the differences of the
+            prefix sums are exact.
+        """
+        lo, hi = self._bounds(start, end)
+        total_income = self._income[hi] - self._income[lo]
+        total_expense = self._expense[hi] - self._expense[lo]
+        return {
+            "total_income": total_income,
+            "total_expense": total_expense,
+            "balance": total_income + total_expense,
+            "transaction_count": hi - lo,
+            "income_transactions": self._income_count[hi] - self._income_count[lo],
+            "expense_transactions": self._expense_count[hi] - self._expense_count[lo]
+        }
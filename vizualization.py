@@ -1,24 +1,46 @@
-from collections import defaultdict, Counter
-import matplotlib.pyplot as plt
 import local as lcl
+from analytics import Aggregator, aggregate_transactions
 
 
-def visualize_financial_data(transactions: list):
+def _pyplot(headless: bool):
+    """
+    Imports pyplot on first use, selecting the non-interactive Agg backend if requested.
+
+    matplotlib takes hundreds of milliseconds to import, so it is only loaded
+    when a chart is actually drawn.
+    """
+    import matplotlib
+    if headless:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def visualize_financial_data(transactions: list, aggregate: Aggregator = None,
+                             output: str = None, kopecks: bool = False):
     """
     Visualizes expenses by category using a bar chart.
 
     Args:
         transactions (list): List of transaction dictionaries.
+        aggregate (Aggregator, optional): Precomputed aggregates of the transactions.
+        output (str, optional): Save the chart to this PNG or SVG file with the
+            headless Agg backend instead of showing it in a window.
+        kopecks (bool): The transactions carry integer kopecks. Only used when the
+            aggregates are computed here. Defaults to False (rubles).
     """
-    if not transactions:
+    if aggregate is None:
+        if not transactions:
+            print(f'{lcl.NO_VISUALIZATION_DATA}')
+            return
+        aggregate = aggregate_transactions(transactions, kopecks=kopecks)
+    elif not aggregate.transaction_count:
         print(f'{lcl.NO_VISUALIZATION_DATA}')
         return
 
-    expenses = defaultdict(float)
-    for t in transactions:
-        if t["amount"] < 0:
-            expenses[t["category"]] += abs(t["amount"])
+    expenses = {cat: aggregate.money(val) for cat, val in aggregate.category_expenses.items()}
     if expenses:
+        plt = _pyplot(headless=output is not None)
         plt.figure(figsize=(8, 5))
         plt.bar(expenses.keys(), expenses.values())
         plt.title(f'{lcl.EXPENSES_BY_CATEGORY}')
@@ -26,4 +48,8 @@ def visualize_financial_data(transactions: list):
         plt.ylabel(f'{lcl.AMOUNT_RUB}')
         plt.xticks(rotation=45, ha="right")
         plt.tight_layout()
-        plt.show()
+        if output is None:
+            plt.show()
+        else:
+            plt.savefig(output)
+            plt.close()